@@ -3,23 +3,22 @@ import numpy as np
 import tensorflow as tf
 import os
 
+import fire_render
+
 # Параметры
 GRID_SIZE = 50
 CELL_SIZE = 10
 SIMULATIONS = 50
 MAX_STEPS = 100
 
-# Цвета
-COLORS = {
-    0: (255, 255, 255),  # Негорящая область
-    1: (255, 0, 0),  # Новый источник огня
-    3: (0, 0, 0),  # Сгоревшая область
-}
-
 # Инициализация Pygame
 pygame.init()
 screen = pygame.display.set_mode((GRID_SIZE * CELL_SIZE * 2, GRID_SIZE * CELL_SIZE))
 pygame.display.set_caption("Fire Simulation Data Viewer")
+# У каждой панели свой renderer: он помнит, что нарисовано в ней
+renderers = [
+    fire_render.GridRenderer((GRID_SIZE, GRID_SIZE), CELL_SIZE) for _ in range(2)
+]
 
 # Загрузка модели
 model = tf.keras.models.load_model("fire_spread_predictor.h5")
@@ -35,17 +34,10 @@ def predict_new_sources(current_grid):
     return new_sources
 
 
-def draw_grid(grid, offset_x=0):
-    for y in range(GRID_SIZE):
-        for x in range(GRID_SIZE):
-            color = COLORS.get(
-                grid[y, x], (0, 0, 255)
-            )  # Синий цвет для неопределенных значений
-            pygame.draw.rect(
-                screen,
-                color,
-                (x * CELL_SIZE + offset_x, y * CELL_SIZE, CELL_SIZE, CELL_SIZE),
-            )
+def draw_grid(grid, panel=0):
+    return renderers[panel].draw_dirty(
+        screen, grid, offset=(panel * GRID_SIZE * CELL_SIZE, 0)
+    )
 
 
 def load_simulation_data(sim, step, data_type):
@@ -81,13 +73,11 @@ while running:
     if current_grid is not None:
         new_sources_predicted = predict_new_sources(current_grid)
 
-        screen.fill((200, 200, 200))
-        draw_grid(current_grid, offset_x=0)
-        draw_grid(new_sources_predicted, offset_x=GRID_SIZE * CELL_SIZE)
+        dirty = draw_grid(current_grid, 0) + draw_grid(new_sources_predicted, 1)
         pygame.display.set_caption(
             f"Fire Simulation Data Viewer - Sim {current_sim}, Step {current_step}"
         )
-        pygame.display.flip()
+        pygame.display.update(dirty)
 
     clock.tick(5)  # Ограничение частоты обновления экрана для лучшей восприимчивости
 
@@ -2,6 +2,9 @@ import pygame
 import numpy as np
 import random
 
+import fire_kernel
+import fire_render
+
 # Параметры симуляции
 GRID_SIZE = 50  # Размер сетки
 NUM_AGENTS = 10  # Количество агентов
@@ -40,9 +43,14 @@ def start_simulation():
         (GRID_SIZE * CELL_SIZE, GRID_SIZE * CELL_SIZE + 50)
     )
     pygame.display.set_caption("Fire Simulation")
+    renderer = fire_render.GridRenderer((GRID_SIZE, GRID_SIZE), CELL_SIZE)
 
-    grid = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
-    fire_duration = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
+    grid = np.zeros((GRID_SIZE, GRID_SIZE), dtype=np.uint8)
+    fire_duration = np.zeros((GRID_SIZE, GRID_SIZE), dtype=np.uint8)
+    spread_probs = fire_kernel.direction_probabilities(
+        FIRE_SPREAD_PROB, WIND_DIRECTION, WIND_STRENGTH
+    )
+    rng = np.random.default_rng()
 
     agents = [
         (random.randint(0, GRID_SIZE - 1), random.choice([0, GRID_SIZE - 1]))
@@ -58,67 +66,14 @@ def start_simulation():
     adding_fire = True
 
     def draw_grid():
-        for y in range(GRID_SIZE):
-            for x in range(GRID_SIZE):
-                color = (
-                    GREEN
-                    if grid[y, x] == 0
-                    else RED if grid[y, x] == 1 else BLUE if grid[y, x] == 2 else BLACK
-                )
-                pygame.draw.rect(
-                    screen,
-                    color,
-                    pygame.Rect(x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE),
-                )
-        for agent in agents:
-            pygame.draw.circle(
-                screen,
-                BLUE,
-                (
-                    agent[0] * CELL_SIZE + CELL_SIZE // 2,
-                    agent[1] * CELL_SIZE + CELL_SIZE // 2,
-                ),
-                CELL_SIZE // 2,
-            )
+        return renderer.draw_dirty(screen, grid, agents)
 
     def spread_fire():
         nonlocal total_burned_cells
-        new_grid = grid.copy()
-        for y in range(GRID_SIZE):
-            for x in range(GRID_SIZE):
-                if grid[y, x] == 1:
-                    fire_duration[y, x] += 1
-                    if fire_duration[y, x] > FIRE_LIFE:
-                        new_grid[y, x] = 3
-                    else:
-                        spread_prob = FIRE_SPREAD_PROB
-                        if random.random() < RAIN_PROBABILITY:
-                            spread_prob *= 0.5
-
-                        directions = [(y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)]
-                        wind_effects = {
-                            "N": (y + 1, x),
-                            "S": (y - 1, x),
-                            "E": (y, x - 1),
-                            "W": (y, x + 1),
-                        }
-                        wind_y, wind_x = wind_effects[WIND_DIRECTION]
-
-                        for dy, dx in directions:
-                            if (
-                                0 <= dy < GRID_SIZE
-                                and 0 <= dx < GRID_SIZE
-                                and grid[dy][dx] == 0
-                            ):
-                                if (dy, dx) == (wind_y, wind_x):
-                                    if random.random() < spread_prob + WIND_STRENGTH:
-                                        new_grid[dy][dx] = 1
-                                        total_burned_cells += 1
-                                else:
-                                    if random.random() < spread_prob:
-                                        new_grid[dy][dx] = 1
-                                        total_burned_cells += 1
-
+        new_grid, ignitions = fire_kernel.spread_fire(
+            grid, fire_duration, spread_probs, RAIN_PROBABILITY, FIRE_LIFE, rng
+        )
+        total_burned_cells += int(ignitions)
         return new_grid
 
     def move_agents():
@@ -163,6 +118,9 @@ def start_simulation():
     button_rect = pygame.Rect(
         (GRID_SIZE * CELL_SIZE // 2 - 50, GRID_SIZE * CELL_SIZE + 10, 100, 30)
     )
+    font = pygame.font.Font(None, 30)
+    screen.fill(WHITE)
+    pygame.display.flip()
 
     while running:
         for event in pygame.event.get():
@@ -184,16 +142,15 @@ def start_simulation():
             grid = spread_fire()
             move_agents()
 
-        screen.fill(WHITE)
-        draw_grid()
+        # Только изменившиеся клетки и кнопка
+        dirty = draw_grid()
 
         pygame.draw.rect(screen, GREY, button_rect)
         button_text = "Start" if not simulation_running else "Stop"
-        font = pygame.font.Font(None, 30)
         text_surface = font.render(button_text, True, BLACK)
         screen.blit(text_surface, (button_rect.x + 10, button_rect.y + 5))
 
-        pygame.display.flip()
+        pygame.display.update(dirty + [button_rect])
         clock.tick(FPS)
 
     if total_burned_cells > 0:
@@ -1,16 +1,34 @@
+import os
 import pygame
 import numpy as np
 import random
 import multiprocessing
 import pandas as pd
 
+import fire_checkpoint
+import fire_kernel
+import fire_loop
+import fire_render
+import fire_simulation
+
 # Параметры симуляции
 GRID_SIZE = 50  # Размер сетки
 NUM_AGENTS_LIST = [5, 10, 15, 20]  # Количество агентов для каждой симуляции
 FIRE_SPREAD_PROB = 0.3  # Базовая скорость распространения огня (0.0 - 1.0)
 FIRE_LIFE = 5  # Продолжительность жизни огня в шагах
 EXTINGUISH_AREA = 3  # Размер области тушения агентов (должен быть нечетным)
-FPS = 10  # Количество кадров в секунду
+FPS = 30  # Количество кадров в секунду
+# Шагов симуляции в секунду, независимо от FPS (None - без ограничения,
+# клавиша U переключает)
+STEPS_PER_SECOND = 10
+FAST_FORWARD_STEP = 300  # Клавиша F: перемотка до этого шага
+# Печатать ходы агентов (только в обычном темпе, не при перемотке и без
+# ограничения скорости: вывод в консоль тормозит шаги)
+LOG_AGENT_MOVES = False
+# Наибольшая сторона поля в окне (пикселей): большая сетка показывается
+# целиком с уменьшением; колесо мыши - масштаб, стрелки - сдвиг
+VIEW_SIZE = 800
+PAN_STEP = 10  # Сдвиг стрелкой, пикселей-клеток окна
 
 # Факторы, влияющие на распространение пожара
 WIND_DIRECTION = "N"  # Направление ветра: 'N', 'S', 'E', 'W'
@@ -30,174 +48,163 @@ GREY = (200, 200, 200)
 # Инициализация Pygame
 pygame.init()
 
+# Стрелки: сдвиг окна просмотра (dx, dy)
+PAN_KEYS = {
+    pygame.K_LEFT: (-1, 0),
+    pygame.K_RIGHT: (1, 0),
+    pygame.K_UP: (0, -1),
+    pygame.K_DOWN: (0, 1),
+}
+
 
 def draw_text(screen, text, position, font, color=BLACK):
     text_surface = font.render(text, True, color)
     screen.blit(text_surface, position)
 
 
-def start_simulation(seed, num_agents, start_fire_pos):
-    random.seed(seed)
-    CELL_SIZE = 10
-    screen = pygame.display.set_mode(
-        (GRID_SIZE * CELL_SIZE, GRID_SIZE * CELL_SIZE + 50)
+# Окно просмотра сетки: вся сетка, если она не помещается при CELL_SIZE
+def make_viewport(cell_size):
+    view_size = min(GRID_SIZE * cell_size, VIEW_SIZE)
+    viewport = fire_render.Viewport(
+        (GRID_SIZE, GRID_SIZE), (view_size, view_size), cell_size
     )
-    pygame.display.set_caption("Fire Simulation")
+    if GRID_SIZE * cell_size > view_size:
+        viewport.fit()
+    return viewport
 
-    grid = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
-    fire_duration = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
 
-    agents = [
-        (random.randint(0, GRID_SIZE - 1), random.choice([0, GRID_SIZE - 1]))
-        for _ in range(num_agents)
-    ]
-    agent_moves = [0] * num_agents
-    extinguished_by_agent = [0] * num_agents
-    steps_to_extinguish = [[] for _ in range(num_agents)]
+def start_simulation(seed, num_agents, start_fire_pos, checkpoint_path=None):
+    CELL_SIZE = 10
+    viewport = make_viewport(CELL_SIZE)
+    view_size = viewport.size[0]
+    view_rect = pygame.Rect(0, 0, view_size, view_size)
+    screen = pygame.display.set_mode((view_size, view_size + 50))
+    pygame.display.set_caption("Fire Simulation")
 
-    total_burned_cells = 0
-    extinguished_cells = 0
-    total_steps_to_extinguish = 0
+    if checkpoint_path is None:
+        checkpoint_path = f"fire_checkpoint_{seed}.npz"
 
-    grid[start_fire_pos[1], start_fire_pos[0]] = 1
-    fire_duration[start_fire_pos[1], start_fire_pos[0]] = 1
+    spread_probs = fire_kernel.direction_probabilities(
+        FIRE_SPREAD_PROB, WIND_DIRECTION, WIND_STRENGTH
+    )
+    rng = np.random.default_rng(seed)
+
+    # Всё состояние запуска (сетка, возраст огня, агенты, счётчики, rng)
+    # хранится в simulation: S - сохранить снимок, L - загрузить
+    simulation = fire_simulation.Simulation(
+        GRID_SIZE,
+        num_agents,
+        spread_probs,
+        RAIN_PROBABILITY,
+        FIRE_LIFE,
+        EXTINGUISH_AREA,
+        rng,
+    )
+    simulation.ignite(start_fire_pos[0], start_fire_pos[1])
 
     def draw_grid():
-        for y in range(GRID_SIZE):
-            for x in range(GRID_SIZE):
-                color = (
-                    GREEN
-                    if grid[y, x] == 0
-                    else RED if grid[y, x] == 1 else BLUE if grid[y, x] == 2 else BLACK
-                )
-                pygame.draw.rect(
-                    screen,
-                    color,
-                    pygame.Rect(x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE),
-                )
-        for agent in agents:
-            pygame.draw.circle(
-                screen,
-                BLUE,
-                (
-                    agent[0] * CELL_SIZE + CELL_SIZE // 2,
-                    agent[1] * CELL_SIZE + CELL_SIZE // 2,
-                ),
-                CELL_SIZE // 2,
-            )
-
-    def spread_fire():
-        nonlocal total_burned_cells
-        new_grid = grid.copy()
-        for y in range(GRID_SIZE):
-            for x in range(GRID_SIZE):
-                if grid[y, x] == 1:
-                    fire_duration[y, x] += 1
-                    if fire_duration[y, x] > FIRE_LIFE:
-                        new_grid[y, x] = 3
-                    else:
-                        spread_prob = FIRE_SPREAD_PROB
-                        if random.random() < RAIN_PROBABILITY:
-                            spread_prob *= 0.5
-
-                        directions = [(y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)]
-                        wind_effects = {
-                            "N": (y + 1, x),
-                            "S": (y - 1, x),
-                            "E": (y, x - 1),
-                            "W": (y, x + 1),
-                        }
-                        wind_y, wind_x = wind_effects[WIND_DIRECTION]
-
-                        for dy, dx in directions:
-                            if (
-                                0 <= dy < GRID_SIZE
-                                and 0 <= dx < GRID_SIZE
-                                and grid[dy][dx] == 0
-                            ):
-                                if (dy, dx) == (wind_y, wind_x):
-                                    if random.random() < spread_prob + WIND_STRENGTH:
-                                        new_grid[dy][dx] = 1
-                                        total_burned_cells += 1
-                                else:
-                                    if random.random() < spread_prob:
-                                        new_grid[dy][dx] = 1
-                                        total_burned_cells += 1
-
-        return new_grid
-
-    def move_agents():
-        nonlocal extinguished_cells
-        nonlocal total_steps_to_extinguish
-        for i, (x, y) in enumerate(agents):
-            distances = {
-                ((x2 - x) ** 2 + (y2 - y) ** 2): (x2, y2)
-                for y2, row in enumerate(grid)
-                for x2, val in enumerate(row)
-                if val == 1
-            }
-            if distances:
-                target_x, target_y = distances[min(distances)]
-                agents[i] = (
-                    max(0, min(GRID_SIZE - 1, x + (1 if target_x > x else -1))),
-                    max(0, min(GRID_SIZE - 1, y + (1 if target_y > y else -1))),
-                )
-                agent_moves[i] += 1
-                steps_to_extinguish[i].append(agent_moves[i])
-                total_steps_to_extinguish += 1
-
-                for dy in range(-(EXTINGUISH_AREA // 2), (EXTINGUISH_AREA // 2) + 1):
-                    for dx in range(
-                        -(EXTINGUISH_AREA // 2), (EXTINGUISH_AREA // 2) + 1
-                    ):
-                        if (
-                            0 <= y + dy < GRID_SIZE
-                            and 0 <= x + dx < GRID_SIZE
-                            and grid[y + dy][x + dx] == 1
-                        ):
-                            grid[y + dy][x + dx] = 3
-                            extinguished_cells += 1
-                            extinguished_by_agent[i] += 1
-
-                print(f"Agent {i} moved to {(target_x, target_y)}")
+        return viewport.draw(screen, simulation.grid, simulation.agents)
+
+    def step():
+        if simulation.finished:
+            return False
+        targets = simulation.step()
+        if (
+            LOG_AGENT_MOVES
+            and fast_forward_to is None
+            and scheduler.steps_per_second is not None
+        ):
+            for i, (target_x, target_y) in enumerate(targets):
+                if target_x >= 0:
+                    print(f"Agent {i} moved to {(target_x, target_y)}")
 
     simulation_running = False
     running = True
-    clock = pygame.time.Clock()
+    # Симуляция идёт в своём темпе, кадр рисует последнее состояние
+    scheduler = fire_loop.StepScheduler(STEPS_PER_SECOND, FPS)
+    fast_forward_to = None
 
-    button_rect = pygame.Rect(
-        (GRID_SIZE * CELL_SIZE // 2 - 50, GRID_SIZE * CELL_SIZE + 10, 100, 30)
-    )
+    button_rect = pygame.Rect((view_size // 2 - 50, view_size + 10, 100, 30))
+    status_rect = pygame.Rect((button_rect.right + 10, view_size + 5, 190, 40))
+    font = pygame.font.Font(None, 30)
+    status_font = pygame.font.Font(None, 20)
+    screen.fill(WHITE)
+    pygame.display.flip()
 
     while running:
+        view_changed = False
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if button_rect.collidepoint(event.pos):
+                if event.button in (4, 5):
+                    # Колесо мыши: масштаб вокруг курсора
+                    viewport.zoom(1 if event.button == 4 else -1, event.pos)
+                    view_changed = True
+                elif button_rect.collidepoint(event.pos):
                     simulation_running = not simulation_running
                 else:
-                    mouse_x, mouse_y = event.pos
-                    grid_x, grid_y = mouse_x // CELL_SIZE, mouse_y // CELL_SIZE
-                    if 0 <= grid_x < GRID_SIZE and 0 <= grid_y < GRID_SIZE:
-                        grid[grid_y][grid_x] = 1
-                        fire_duration[grid_y][grid_x] = 1
-
-        if simulation_running:
-            grid = spread_fire()
-            move_agents()
-
-        screen.fill(WHITE)
-        draw_grid()
+                    cell = viewport.to_cell(event.pos)
+                    if cell is not None:
+                        simulation.ignite(*cell)
+            elif event.type == pygame.KEYDOWN:
+                if event.key in PAN_KEYS:
+                    viewport.pan(*(PAN_STEP * d for d in PAN_KEYS[event.key]))
+                    view_changed = True
+                elif event.key == pygame.K_s:
+                    fire_checkpoint.save(checkpoint_path, simulation)
+                    print(f"Checkpoint saved to {checkpoint_path}")
+                elif event.key == pygame.K_l and os.path.exists(checkpoint_path):
+                    simulation, _ = fire_checkpoint.load(checkpoint_path)
+                    print(f"Checkpoint loaded from {checkpoint_path}")
+                elif event.key == pygame.K_f:
+                    fast_forward_to = FAST_FORWARD_STEP
+                elif event.key == pygame.K_u:
+                    scheduler.steps_per_second = (
+                        STEPS_PER_SECOND if scheduler.steps_per_second is None else None
+                    )
+
+        if fast_forward_to is not None:
+            scheduler.run(step, fast_forward_to - simulation.total_steps)
+            if simulation.total_steps >= fast_forward_to or simulation.finished:
+                fast_forward_to = None
+        elif simulation_running:
+            scheduler.run(step)
+        else:
+            scheduler.pause()
+
+        # Только изменившиеся клетки и кнопка; после смены масштаба или
+        # сдвига - всё поле
+        if view_changed:
+            screen.fill(WHITE, view_rect)
+            viewport.invalidate()
+        dirty = draw_grid()
+        if view_changed:
+            dirty = [view_rect]
 
         pygame.draw.rect(screen, GREY, button_rect)
         button_text = "Start" if not simulation_running else "Stop"
-        font = pygame.font.Font(None, 30)
         text_surface = font.render(button_text, True, BLACK)
         screen.blit(text_surface, (button_rect.x + 10, button_rect.y + 5))
 
-        pygame.display.flip()
-        clock.tick(FPS)
+        screen.fill(WHITE, status_rect)
+        draw_text(
+            screen, f"Step {simulation.total_steps}", status_rect.topleft, status_font
+        )
+        draw_text(
+            screen,
+            scheduler.status(),
+            (status_rect.x, status_rect.y + 20),
+            status_font,
+        )
+
+        pygame.display.update(dirty + [button_rect, status_rect])
+        scheduler.frame_done()
+
+    counters = simulation.counters()
+    total_burned_cells = counters["total_burned_cells"]
+    extinguished_cells = counters["extinguished_cells"]
+    total_steps_to_extinguish = counters["total_steps_to_extinguish"]
 
     if total_burned_cells > 0:
         efficiency = extinguished_cells / total_burned_cells
@@ -247,35 +254,37 @@ def save_results_to_excel(results):
 
 def main():
     CELL_SIZE = 10
-    screen = pygame.display.set_mode(
-        (GRID_SIZE * CELL_SIZE, GRID_SIZE * CELL_SIZE + 50)
-    )
+    # Клик переводится в клетку так же, как в окне симуляции
+    viewport = make_viewport(CELL_SIZE)
+    view_size = viewport.size[0]
+    screen = pygame.display.set_mode((view_size, view_size + 50))
     pygame.display.set_caption("Select Start Fire Position")
 
     running = True
     start_fire_pos = None
     clock = pygame.time.Clock()
+    font = pygame.font.Font(None, 30)
+
+    # Экран выбора не меняется: рисуется один раз
+    screen.fill(WHITE)
+    draw_text(
+        screen,
+        "Click to select start fire position",
+        (10, view_size + 10),
+        font,
+    )
+    pygame.display.flip()
 
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_x, mouse_y = event.pos
-                grid_x, grid_y = mouse_x // CELL_SIZE, mouse_y // CELL_SIZE
-                if 0 <= grid_x < GRID_SIZE and 0 <= grid_y < GRID_SIZE:
-                    start_fire_pos = (grid_x, grid_y)
+                cell = viewport.to_cell(event.pos)
+                if cell is not None:
+                    start_fire_pos = cell
                     running = False
 
-        screen.fill(WHITE)
-        font = pygame.font.Font(None, 30)
-        draw_text(
-            screen,
-            "Click to select start fire position",
-            (10, GRID_SIZE * CELL_SIZE + 10),
-            font,
-        )
-        pygame.display.flip()
         clock.tick(FPS)
 
     pygame.quit()
@@ -1,10 +1,17 @@
+import os
 import pygame
 import numpy as np
-import random
 import threading
 import pandas as pd
 from queue import Queue
 
+import fire_checkpoint
+import fire_kernel
+import fire_loop
+import fire_render
+import fire_rng
+import fire_simulation
+
 # Параметры симуляции
 GRID_SIZE = 50  # Размер сетки
 NUM_AGENTS_LIST = [0, 0, 0, 0]  # Количество агентов для каждой симуляции
@@ -12,6 +19,14 @@ FIRE_SPREAD_PROB = 0.3  # Базовая скорость распростран
 FIRE_LIFE = 5  # Продолжительность жизни огня в шагах
 EXTINGUISH_AREA = 3  # Размер области тушения агентов (должен быть нечетным)
 FPS = 10  # Количество кадров в секунду
+# Шагов симуляции в секунду, независимо от FPS (None - без ограничения)
+STEPS_PER_SECOND = 10
+CHECKPOINT_EVERY = 50  # Шагов между автосохранениями запуска
+# Высота строки под каждой панелью: шаг, шагов и кадров в секунду
+STATUS_HEIGHT = 20
+# Снимок панели по её номеру; вместе с состоянием хранится главное зерно,
+# поэтому перезапуск после сбоя продолжает те же пожары
+CHECKPOINT_PATH = "fire_checkpoint_panel{}.npz"
 
 # Факторы, влияющие на распространение пожара
 WIND_DIRECTION = "N"  # Направление ветра: 'N', 'S', 'E', 'W'
@@ -53,148 +68,110 @@ def draw_grid(screen, cell_size, offset_x=0, offset_y=0):
             )
 
 
-def start_simulation(
-    seed, num_agents, start_fire_pos, screen, offset_x, offset_y, result_queue
-):
-    random.seed(seed)
-    CELL_SIZE = 10
+# Главное зерно прерванного запуска из снимка любой панели, иначе новое
+def resume_master_seed(num_simulations):
+    for panel in range(num_simulations):
+        checkpoint_path = CHECKPOINT_PATH.format(panel)
+        if os.path.exists(checkpoint_path):
+            return int(fire_checkpoint.load(checkpoint_path)[1]["master_seed"])
+    return fire_rng.new_master_seed()
 
-    grid = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
-    fire_duration = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
 
-    agents = [
-        (random.randint(0, GRID_SIZE - 1), random.choice([0, GRID_SIZE - 1]))
-        for _ in range(num_agents)
-    ]
-    agent_moves = [0] * num_agents
-    extinguished_by_agent = [0] * num_agents
-    steps_to_extinguish = [[] for _ in range(num_agents)]
+# Снимок подходит, только если он сделан для того же зерна, числа агентов и
+# точки возгорания
+def load_checkpoint(checkpoint_path, master_seed, num_agents, start_fire_pos):
+    if not os.path.exists(checkpoint_path):
+        return None
+    simulation, extra = fire_checkpoint.load(checkpoint_path)
+    if (
+        extra.get("master_seed") != master_seed
+        or extra.get("num_agents") != num_agents
+        or tuple(np.asarray(extra.get("start_fire_pos")).tolist())
+        != tuple(start_fire_pos)
+    ):
+        return None
+    return simulation
+
 
-    total_burned_cells = 0
-    extinguished_cells = 0
-    total_steps_to_extinguish = 0
+def start_simulation(
+    master_seed,
+    panel,
+    num_agents,
+    start_fire_pos,
+    screen,
+    offset_x,
+    offset_y,
+    result_queue,
+    status_font,
+):
+    CELL_SIZE = 10
+    status_rect = pygame.Rect(
+        offset_x, offset_y + GRID_SIZE * CELL_SIZE, GRID_SIZE * CELL_SIZE, STATUS_HEIGHT
+    )
+    checkpoint_path = CHECKPOINT_PATH.format(panel)
+    renderer = fire_render.GridRenderer((GRID_SIZE, GRID_SIZE), CELL_SIZE)
 
-    grid[start_fire_pos[1], start_fire_pos[0]] = 1
-    fire_duration[start_fire_pos[1], start_fire_pos[0]] = 1
+    # Продолжение прерванного запуска с последнего снимка
+    simulation = load_checkpoint(
+        checkpoint_path, master_seed, num_agents, start_fire_pos
+    )
+    if simulation is None:
+        spread_probs = fire_kernel.direction_probabilities(
+            FIRE_SPREAD_PROB, WIND_DIRECTION, WIND_STRENGTH
+        )
+        rng = fire_rng.stream(master_seed, panel)
+        simulation = fire_simulation.Simulation(
+            GRID_SIZE,
+            num_agents,
+            spread_probs,
+            RAIN_PROBABILITY,
+            FIRE_LIFE,
+            EXTINGUISH_AREA,
+            rng,
+        )
+        simulation.ignite(start_fire_pos[0], start_fire_pos[1])
 
     def draw_grid_sim():
-        for y in range(GRID_SIZE):
-            for x in range(GRID_SIZE):
-                color = (
-                    GREEN
-                    if grid[y, x] == 0
-                    else RED if grid[y, x] == 1 else BLUE if grid[y, x] == 2 else BLACK
-                )
-                pygame.draw.rect(
-                    screen,
-                    color,
-                    pygame.Rect(
-                        x * CELL_SIZE + offset_x,
-                        y * CELL_SIZE + offset_y,
-                        CELL_SIZE,
-                        CELL_SIZE,
-                    ),
-                )
-        for agent in agents:
-            pygame.draw.circle(
-                screen,
-                BLUE,
-                (
-                    agent[0] * CELL_SIZE + CELL_SIZE // 2 + offset_x,
-                    agent[1] * CELL_SIZE + CELL_SIZE // 2 + offset_y,
-                ),
-                CELL_SIZE // 2,
-            )
+        return renderer.draw_dirty(
+            screen, simulation.grid, simulation.agents, (offset_x, offset_y)
+        )
 
-    def spread_fire():
-        nonlocal total_burned_cells
-        new_grid = grid.copy()
-        for y in range(GRID_SIZE):
-            for x in range(GRID_SIZE):
-                if grid[y, x] == 1:
-                    fire_duration[y, x] += 1
-                    if fire_duration[y, x] > FIRE_LIFE:
-                        new_grid[y, x] = 3
-                    else:
-                        spread_prob = FIRE_SPREAD_PROB
-                        if random.random() < RAIN_PROBABILITY:
-                            spread_prob *= 0.5
-
-                        directions = [(y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)]
-                        wind_effects = {
-                            "N": (y + 1, x),
-                            "S": (y - 1, x),
-                            "E": (y, x - 1),
-                            "W": (y, x + 1),
-                        }
-                        wind_y, wind_x = wind_effects[WIND_DIRECTION]
-
-                        for dy, dx in directions:
-                            if (
-                                0 <= dy < GRID_SIZE
-                                and 0 <= dx < GRID_SIZE
-                                and grid[dy][dx] == 0
-                            ):
-                                if (dy, dx) == (wind_y, wind_x):
-                                    if random.random() < spread_prob + WIND_STRENGTH:
-                                        new_grid[dy][dx] = 1
-                                        total_burned_cells += 1
-                                else:
-                                    if random.random() < spread_prob:
-                                        new_grid[dy][dx] = 1
-                                        total_burned_cells += 1
-
-        return new_grid
-
-    def move_agents():
-        nonlocal extinguished_cells
-        nonlocal total_steps_to_extinguish
-        for i, (x, y) in enumerate(agents):
-            distances = {
-                ((x2 - x) ** 2 + (y2 - y) ** 2): (x2, y2)
-                for y2, row in enumerate(grid)
-                for x2, val in enumerate(row)
-                if val == 1
-            }
-            if distances:
-                target_x, target_y = distances[min(distances)]
-                agents[i] = (
-                    max(0, min(GRID_SIZE - 1, x + (1 if target_x > x else -1))),
-                    max(0, min(GRID_SIZE - 1, y + (1 if target_y > y else -1))),
-                )
-                agent_moves[i] += 1
-                steps_to_extinguish[i].append(agent_moves[i])
-                total_steps_to_extinguish += 1
-
-                for dy in range(-(EXTINGUISH_AREA // 2), (EXTINGUISH_AREA // 2) + 1):
-                    for dx in range(
-                        -(EXTINGUISH_AREA // 2), (EXTINGUISH_AREA // 2) + 1
-                    ):
-                        if (
-                            0 <= y + dy < GRID_SIZE
-                            and 0 <= x + dx < GRID_SIZE
-                            and grid[y + dy][x + dx] == 1
-                        ):
-                            grid[y + dy][x + dx] = 3
-                            extinguished_cells += 1
-                            extinguished_by_agent[i] += 1
-
-    simulation_running = True
-    clock = pygame.time.Clock()
+    def step():
+        if simulation.finished:
+            return False
+        simulation.step()
+        if simulation.total_steps % CHECKPOINT_EVERY == 0:
+            fire_checkpoint.save(
+                checkpoint_path,
+                simulation,
+                master_seed=master_seed,
+                num_agents=num_agents,
+                start_fire_pos=np.array(start_fire_pos),
+            )
 
-    while simulation_running:
-        grid = spread_fire()
-        move_agents()
+    # Шаги идут в своём темпе, панель рисует последнее состояние
+    scheduler = fire_loop.StepScheduler(STEPS_PER_SECOND, FPS)
+    while not simulation.finished:
+        scheduler.run(step)
 
-        screen.fill(
-            WHITE, (offset_x, offset_y, GRID_SIZE * CELL_SIZE, GRID_SIZE * CELL_SIZE)
+        # Обновляются только изменившиеся участки своей панели и её строка
+        screen.fill(WHITE, status_rect)
+        draw_text(
+            screen,
+            f"Step {simulation.total_steps}, {scheduler.status()}",
+            (status_rect.x + 5, status_rect.y + 3),
+            status_font,
         )
-        draw_grid_sim()
-        pygame.display.flip()
-        clock.tick(FPS)
+        pygame.display.update(draw_grid_sim() + [status_rect])
+        scheduler.frame_done()
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
 
-        if np.all((grid == 0) | (grid == 3)):
-            simulation_running = False
+    counters = simulation.counters()
+    total_burned_cells = counters["total_burned_cells"]
+    extinguished_cells = counters["extinguished_cells"]
+    total_steps_to_extinguish = counters["total_steps_to_extinguish"]
 
     if total_burned_cells > 0:
         efficiency = extinguished_cells / total_burned_cells
@@ -223,28 +200,42 @@ def start_simulation(
 
 
 def run_simulations(start_fire_pos, num_simulations, num_agents_list):
-    seeds = [random.randint(0, 1000000) for _ in range(num_simulations)]
-    screen = pygame.display.set_mode((GRID_SIZE * 2 * 10, GRID_SIZE * 2 * 10))
+    master_seed = resume_master_seed(num_simulations)
+    print(f"Master seed: {master_seed}")
+    panel_height = GRID_SIZE * 10 + STATUS_HEIGHT
+    screen = pygame.display.set_mode((GRID_SIZE * 2 * 10, panel_height * 2))
     pygame.display.set_caption("Fire Simulation")
+    screen.fill(WHITE)
+    pygame.display.flip()
+    pygame.font.init()
+    status_font = pygame.font.Font(None, 20)
 
     threads = []
     offsets = [
         (0, 0),
         (GRID_SIZE * 10, 0),
-        (0, GRID_SIZE * 10),
-        (GRID_SIZE * 10, GRID_SIZE * 10),
+        (0, panel_height),
+        (GRID_SIZE * 10, panel_height),
     ]
     result_queue = Queue()
 
-    def simulation_thread(seed, num_agents, start_fire_pos, offset):
+    def simulation_thread(panel, num_agents, start_fire_pos, offset):
         start_simulation(
-            seed, num_agents, start_fire_pos, screen, offset[0], offset[1], result_queue
+            master_seed,
+            panel,
+            num_agents,
+            start_fire_pos,
+            screen,
+            offset[0],
+            offset[1],
+            result_queue,
+            status_font,
         )
 
     for i in range(num_simulations):
         t = threading.Thread(
             target=simulation_thread,
-            args=(seeds[i], num_agents_list[i], start_fire_pos, offsets[i]),
+            args=(i, num_agents_list[i], start_fire_pos, offsets[i]),
         )
         threads.append(t)
 
@@ -276,6 +267,18 @@ def main():
     running = True
     start_fire_pos = None
     clock = pygame.time.Clock()
+    font = pygame.font.Font(None, 30)
+
+    # Экран выбора не меняется: рисуется один раз
+    screen.fill(WHITE)
+    draw_text(
+        screen,
+        "Click to select start fire position",
+        (10, GRID_SIZE * CELL_SIZE + 10),
+        font,
+    )
+    draw_grid(screen, CELL_SIZE)
+    pygame.display.flip()
 
     while running:
         for event in pygame.event.get():
@@ -288,16 +291,6 @@ def main():
                     start_fire_pos = (grid_x, grid_y)
                     running = False
 
-        screen.fill(WHITE)
-        font = pygame.font.Font(None, 30)
-        draw_text(
-            screen,
-            "Click to select start fire position",
-            (10, GRID_SIZE * CELL_SIZE + 10),
-            font,
-        )
-        draw_grid(screen, CELL_SIZE)
-        pygame.display.flip()
         clock.tick(FPS)
 
     pygame.quit()
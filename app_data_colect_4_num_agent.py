@@ -1,8 +1,18 @@
+import os
+
 import numpy as np
-import random
-import threading
 import pandas as pd
-from queue import Queue
+
+import fire_adaptive
+import fire_batch
+import fire_checkpoint
+import fire_ensemble
+import fire_kernel
+import fire_rng
+import fire_simulation
+import fire_splitting
+import fire_sweep
+import fire_terrain
 
 # Параметры симуляции
 GRID_SIZE = 50  # Размер сетки
@@ -10,6 +20,10 @@ NUM_AGENTS_LIST = [5, 10, 15, 20]  # Количество агентов для
 FIRE_SPREAD_PROB = 0.3  # Базовая скорость распространения огня (0.0 - 1.0)
 FIRE_LIFE = 5  # Продолжительность жизни огня в шагах
 EXTINGUISH_AREA = 3  # Размер области тушения агентов (должен быть нечетным)
+# Ход агентов: "sequential" - по очереди, "simultaneous" - все сразу (для
+# больших команд и больших EXTINGUISH_AREA) или политика fire_policy:
+# "greedy", "regions", "assignment"
+AGENT_MODE = "sequential"
 FPS = 10  # Количество кадров в секунду
 
 # Факторы, влияющие на распространение пожара
@@ -19,111 +33,118 @@ RAIN_PROBABILITY = (
     0.1  # Вероятность дождя, замедляющего распространение огня (0.0 - 1.0)
 )
 
+# Неоднородная местность для start_simulation() (None - однородный лес):
+# карты (GRID_SIZE, GRID_SIZE) горючести (0 - вода или просека) и высот,
+# расписание ветра [(шаг, направление, сила), ...]
+FUEL_MAP = None
+ELEVATION_MAP = None
+SLOPE_FACTOR = 0.0
+WIND_SCHEDULE = None
+
+# Главное зерно серии (None - случайное). По нему и номеру запуска любой
+# запуск можно повторить отдельно через rerun_simulation()
+MASTER_SEED = None
+
+# Файл автосохранения серии: после падения процесса повторный запуск
+# продолжит серию с последнего снимка (None - без снимков)
+CHECKPOINT_PATH = "fire_simulation_checkpoint.npz"
+CHECKPOINT_EVERY = 100  # Шагов между снимками
+
+# Процессов для серии: None - по числу ядер (fire_batch), 0 - один процесс
+# ансамблем со снимками CHECKPOINT_PATH (run_simulations())
+WORKERS = None
+# Таблица заданий серии на пуле процессов: готовые пакеты записываются сразу,
+# повторный запуск после сбоя продолжает серию (None - без таблицы)
+SERIES_PATH = "fire_series.sqlite"
+
+# Перебор параметров (fire_sweep) вместо правки констант выше: оси -
+# spread_prob, wind_direction, wind_strength, rain_probability,
+# extinguish_area, num_agents; значение оси - список вариантов или диапазон
+# fire_sweep.Range(low, high, num) (num - значений для всех сочетаний; для
+# extinguish_area нужны нечётные размеры: Range(1, 7, step=2)).
+# Не заданные оси берутся из констант, num_agents - из NUM_AGENTS_LIST.
+# None - обычная серия. Например:
+# SWEEP = {"spread_prob": fire_sweep.Range(0.2, 0.4, 5), "wind_direction": ["N", "E"]}
+SWEEP = None
+SWEEP_SAMPLES = None  # Точек латинского гиперкуба (None - все сочетания осей)
+# Таблица заданий перебора: повторный запуск продолжает перебор и не
+# пересчитывает готовые задания
+SWEEP_PATH = "fire_sweep.sqlite"
+
+# Адаптивная серия вместо num_runs запусков на конфигурацию: конфигурация
+# останавливается, когда полуширина 95% доверительного интервала каждой
+# метрики ADAPTIVE_METRICS не больше ADAPTIVE_TARGET (одно число или словарь
+# по метрике)
+ADAPTIVE = False
+ADAPTIVE_METRICS = ("Efficiency",)
+ADAPTIVE_TARGET = 0.01
+ADAPTIVE_MIN_RUNS = 10
+ADAPTIVE_MAX_RUNS = 2000
+
+# Общие случайные числа: все конфигурации запуска run горят на одном и том же
+# пожаре (одна точка возгорания и одни числа распространения огня по
+# клеткам), отличаются только агенты. Итог - парные разности метрик
+# PAIRED_METRICS с первой конфигурацией NUM_AGENTS_LIST.
+COMMON_RANDOM_NUMBERS = False
+PAIRED_METRICS = ("Efficiency", "Total burned cells")
+
+# Вероятность катастрофического пожара (огонь коснулся больше
+# CATASTROPHE_THRESHOLD клеток сетки) для каждого числа агентов
+# NUM_AGENTS_LIST многоуровневым расщеплением fire_splitting вместо простого
+# Монте-Карло. Промежуточные уровни - доли сетки по пути к порогу; effort -
+# траекторий на этап, repeats - независимых повторов для погрешности.
+SPLITTING = False
+CATASTROPHE_THRESHOLD = 0.8
+SPLITTING_LEVELS = (0.2, 0.35, 0.5, 0.65)
+SPLITTING_EFFORT = 200
+SPLITTING_REPEATS = 20
+
 
 def start_simulation(seed, num_agents, start_fire_pos, result_queue):
-    random.seed(seed)
-    grid = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
-    fire_duration = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
+    rng = fire_rng.stream(seed)
+    field = fire_terrain.ProbabilityField(
+        (GRID_SIZE, GRID_SIZE),
+        FIRE_SPREAD_PROB,
+        WIND_DIRECTION,
+        WIND_STRENGTH,
+        fuel=FUEL_MAP,
+        elevation=ELEVATION_MAP,
+        slope_factor=SLOPE_FACTOR,
+        schedule=WIND_SCHEDULE,
+    )
+    simulation = fire_simulation.Simulation(
+        GRID_SIZE,
+        num_agents,
+        field.probs,
+        RAIN_PROBABILITY,
+        FIRE_LIFE,
+        EXTINGUISH_AREA,
+        rng,
+        AGENT_MODE,
+    )
+    simulation.ignite(start_fire_pos[0], start_fire_pos[1])
+
+    counters = simulation.advance(field=field)
+    result = make_result(
+        num_agents,
+        counters["total_burned_cells"],
+        counters["extinguished_cells"],
+        counters["total_steps_to_extinguish"],
+        counters["total_steps"],
+        counters["agent_moves"],
+    )
 
-    agents = [
-        (random.randint(0, GRID_SIZE - 1), random.choice([0, GRID_SIZE - 1]))
-        for _ in range(num_agents)
-    ]
-    agent_moves = [0] * num_agents
-    extinguished_by_agent = [0] * num_agents
-    steps_to_extinguish = [[] for _ in range(num_agents)]
-
-    total_burned_cells = 0
-    extinguished_cells = 0
-    total_steps_to_extinguish = 0
-    total_steps = 0
-
-    grid[start_fire_pos[1], start_fire_pos[0]] = 1
-    fire_duration[start_fire_pos[1], start_fire_pos[0]] = 1
-
-    def spread_fire():
-        nonlocal total_burned_cells
-        new_grid = grid.copy()
-        for y in range(GRID_SIZE):
-            for x in range(GRID_SIZE):
-                if grid[y, x] == 1:
-                    fire_duration[y, x] += 1
-                    if fire_duration[y, x] > FIRE_LIFE:
-                        new_grid[y, x] = 3
-                    else:
-                        spread_prob = FIRE_SPREAD_PROB
-                        if random.random() < RAIN_PROBABILITY:
-                            spread_prob *= 0.5
-
-                        directions = [(y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)]
-                        wind_effects = {
-                            "N": (y + 1, x),
-                            "S": (y - 1, x),
-                            "E": (y, x - 1),
-                            "W": (y, x + 1),
-                        }
-                        wind_y, wind_x = wind_effects[WIND_DIRECTION]
-
-                        for dy, dx in directions:
-                            if (
-                                0 <= dy < GRID_SIZE
-                                and 0 <= dx < GRID_SIZE
-                                and grid[dy][dx] == 0
-                            ):
-                                if (dy, dx) == (wind_y, wind_x):
-                                    if random.random() < spread_prob + WIND_STRENGTH:
-                                        new_grid[dy][dx] = 1
-                                        total_burned_cells += 1
-                                else:
-                                    if random.random() < spread_prob:
-                                        new_grid[dy][dx] = 1
-                                        total_burned_cells += 1
-
-        return new_grid
-
-    def move_agents():
-        nonlocal extinguished_cells
-        nonlocal total_steps_to_extinguish
-        for i, (x, y) in enumerate(agents):
-            distances = {
-                ((x2 - x) ** 2 + (y2 - y) ** 2): (x2, y2)
-                for y2, row in enumerate(grid)
-                for x2, val in enumerate(row)
-                if val == 1
-            }
-            if distances:
-                target_x, target_y = distances[min(distances)]
-                agents[i] = (
-                    max(0, min(GRID_SIZE - 1, x + (1 if target_x > x else -1))),
-                    max(0, min(GRID_SIZE - 1, y + (1 if target_y > y else -1))),
-                )
-                agent_moves[i] += 1
-                steps_to_extinguish[i].append(agent_moves[i])
-                total_steps_to_extinguish += 1
-
-                for dy in range(-(EXTINGUISH_AREA // 2), (EXTINGUISH_AREA // 2) + 1):
-                    for dx in range(
-                        -(EXTINGUISH_AREA // 2), (EXTINGUISH_AREA // 2) + 1
-                    ):
-                        if (
-                            0 <= y + dy < GRID_SIZE
-                            and 0 <= x + dx < GRID_SIZE
-                            and grid[y + dy][x + dx] == 1
-                        ):
-                            grid[y + dy][x + dx] = 3
-                            extinguished_cells += 1
-                            extinguished_by_agent[i] += 1
-
-    simulation_running = True
-
-    while simulation_running:
-        total_steps += 1
-        grid = spread_fire()
-        move_agents()
-
-        if np.all((grid == 0) | (grid == 3)):
-            simulation_running = False
+    result_queue.put(result)
 
+
+def make_result(
+    num_agents,
+    total_burned_cells,
+    extinguished_cells,
+    total_steps_to_extinguish,
+    total_steps,
+    agent_moves,
+):
     if total_burned_cells > 0:
         efficiency = extinguished_cells / total_burned_cells
     else:
@@ -138,7 +159,7 @@ def start_simulation(seed, num_agents, start_fire_pos, result_queue):
         (extinguished_cells / total_burned_cells) * 100 if total_burned_cells > 0 else 0
     )
 
-    result = {
+    return {
         "Number of Agents": num_agents,
         "Total burned cells": total_burned_cells,
         "Extinguished cells": extinguished_cells,
@@ -146,51 +167,474 @@ def start_simulation(seed, num_agents, start_fire_pos, result_queue):
         "Average steps to extinguish": avg_steps_to_extinguish,
         "Percentage extinguished": percent_extinguished,
         "Total Steps": total_steps,
-        "Agent Moves": sum(agent_moves),
+        "Agent Moves": agent_moves,
     }
 
-    result_queue.put(result)
+
+# Точка возгорания запуска run, общая для всех конфигураций этого запуска
+def start_position(master_seed, run):
+    x, y = fire_rng.stream(master_seed, run).integers(0, GRID_SIZE, 2)
+    return int(x), int(y)
+
+
+def ensemble_results(results, runs, configs):
+    return [
+        dict(
+            make_result(
+                int(results["num_agents"][i]),
+                int(results["total_burned_cells"][i]),
+                int(results["extinguished_cells"][i]),
+                int(results["total_steps_to_extinguish"][i]),
+                int(results["total_steps"][i]),
+                int(results["agent_moves"][i].sum()),
+            ),
+            Run=int(runs[i]),
+            Config=int(configs[i]),
+        )
+        for i in range(len(results["num_agents"]))
+    ]
 
 
-def run_simulations(num_simulations, num_agents_list, num_runs):
-    result_queue = Queue()
-    threads = []
+# Все запуски (run, количество агентов) идут одним ансамблем вместо потока на
+# каждую симуляцию. У каждой пары (run, config) свой поток случайных чисел,
+# поэтому результат не зависит от того, в какой пакет попал запуск. С общими
+# случайными числами поток общий у всех конфигураций запуска run, как в
+# run_simulations_parallel().
+def run_simulations(
+    num_simulations,
+    num_agents_list,
+    num_runs,
+    master_seed,
+    checkpoint_path=None,
+    common_random_numbers=COMMON_RANDOM_NUMBERS,
+):
+    runs = np.repeat(np.arange(num_runs), num_simulations)
+    configs = np.tile(np.arange(num_simulations), num_runs)
+    if common_random_numbers:
+        rng = fire_rng.common_streams(master_seed, runs.tolist())
+    else:
+        rng = fire_rng.streams(master_seed, zip(runs.tolist(), configs.tolist()))
+
+    results = fire_ensemble.run_ensemble(
+        GRID_SIZE,
+        np.asarray(num_agents_list)[configs],
+        [start_position(master_seed, run) for run in runs],
+        FIRE_SPREAD_PROB,
+        WIND_DIRECTION,
+        WIND_STRENGTH,
+        RAIN_PROBABILITY,
+        FIRE_LIFE,
+        EXTINGUISH_AREA,
+        rng,
+        checkpoint_path=checkpoint_path,
+        checkpoint_every=CHECKPOINT_EVERY,
+        checkpoint_extra={"master_seed": master_seed},
+        agent_mode=AGENT_MODE,
+    )
 
-    for _ in range(num_runs):
-        start_fire_pos = (
-            random.randint(0, GRID_SIZE - 1),
-            random.randint(0, GRID_SIZE - 1),
+    return ensemble_results(results, runs, configs)
+
+
+# Та же серия на пуле процессов fire_batch. Результаты приходят пакетами по
+# мере готовности, и каждый готовый пакет сразу записывается в таблицу
+# заданий path (fire_sweep.JobStore, ключ (run, config) в столбцах point,
+# run). После сбоя или Ctrl-C повторный вызов с тем же главным зерном
+# пересчитывает только незаконченные запуски; законченная серия удаляет файл.
+# path=None - без таблицы, при Ctrl-C возвращаются уже готовые запуски.
+def run_simulations_parallel(
+    num_simulations,
+    num_agents_list,
+    num_runs,
+    master_seed,
+    workers=WORKERS,
+    common_random_numbers=COMMON_RANDOM_NUMBERS,
+    path=None,
+):
+    settings = {
+        "grid_size": GRID_SIZE,
+        "spread_prob": FIRE_SPREAD_PROB,
+        "wind_direction": WIND_DIRECTION,
+        "wind_strength": WIND_STRENGTH,
+        "rain_probability": RAIN_PROBABILITY,
+        "fire_life": FIRE_LIFE,
+        "extinguish_area": EXTINGUISH_AREA,
+        "agent_mode": AGENT_MODE,
+    }
+    common = 1 if common_random_numbers else None
+    jobs = [
+        (
+            (run, config),
+            {
+                "num_agents": num_agents_list[config],
+                "start_fire_pos": start_position(master_seed, run),
+            },
         )
-        seeds = [random.randint(0, 1000000) for _ in range(num_simulations)]
-        for i in range(num_simulations):
-            t = threading.Thread(
-                target=start_simulation,
-                args=(seeds[i], num_agents_list[i], start_fire_pos, result_queue),
+        for run in range(num_runs)
+        for config in range(num_simulations)
+    ]
+    if path is not None:
+        return _run_series_store(jobs, master_seed, settings, workers, common, path)
+
+    rows = []
+    try:
+        for keys, results in fire_batch.run_batch(
+            jobs, master_seed, settings, workers, common=common
+        ):
+            runs, configs = zip(*keys)
+            rows.extend(ensemble_results(results, runs, configs))
+            print(f"Finished {len(rows)}/{len(jobs)} simulations")
+    except KeyboardInterrupt:
+        print(f"Interrupted: keeping {len(rows)}/{len(jobs)} finished simulations")
+    return sorted(rows, key=lambda row: (row["Run"], row["Config"]))
+
+
+# Серия run_simulations_parallel() с таблицей заданий. В параметры заданий
+# входят общие настройки и режим случайных чисел, поэтому таблица другой серии
+# не продолжается, а даёт ошибку JobStore.add().
+def _run_series_store(jobs, master_seed, settings, workers, common, path):
+    with fire_sweep.JobStore(path) as store:
+        store.add(
+            [
+                (key, dict(settings, **params, common_random_numbers=common))
+                for key, params in jobs
+            ],
+            master_seed,
+        )
+        pending = [
+            (key, {name: params[name] for name in ("num_agents", "start_fire_pos")})
+            for key, params in store.pending()
+        ]
+        try:
+            for keys, results in fire_batch.run_batch(
+                pending, master_seed, settings, workers, common=common
+            ):
+                store.finish(keys, results)
+                print("Finished {}/{} simulations".format(*store.progress()))
+        except KeyboardInterrupt:
+            print(f"Interrupted: run again to resume the series from {path}")
+
+        rows = [
+            dict(
+                make_result(
+                    row["num_agents"],
+                    row["total_burned_cells"],
+                    row["extinguished_cells"],
+                    row["total_steps_to_extinguish"],
+                    row["total_steps"],
+                    row["agent_moves"],
+                ),
+                Run=row["point"],
+                Config=row["run"],
             )
-            threads.append(t)
+            for row in store.results()
+        ]
+        done, total = store.progress()
+    if done == total:
+        os.remove(path)
+    return rows
+
+
+# Серия, в которой число запусков каждой конфигурации подбирается по
+# точности метрик. Возвращает (строки запусков, итог по конфигурациям).
+def run_simulations_adaptive(
+    num_agents_list,
+    master_seed,
+    metrics=ADAPTIVE_METRICS,
+    target=ADAPTIVE_TARGET,
+    min_runs=ADAPTIVE_MIN_RUNS,
+    max_runs=ADAPTIVE_MAX_RUNS,
+    workers=WORKERS,
+    common_random_numbers=COMMON_RANDOM_NUMBERS,
+):
+    adaptive = fire_adaptive.AdaptiveRuns(
+        len(num_agents_list), metrics, target, min_runs=min_runs, max_runs=max_runs
+    )
+    settings = {
+        "grid_size": GRID_SIZE,
+        "spread_prob": FIRE_SPREAD_PROB,
+        "wind_direction": WIND_DIRECTION,
+        "wind_strength": WIND_STRENGTH,
+        "rain_probability": RAIN_PROBABILITY,
+        "fire_life": FIRE_LIFE,
+        "extinguish_area": EXTINGUISH_AREA,
+        "agent_mode": AGENT_MODE,
+    }
+
+    def make_params(run, config):
+        return {
+            "num_agents": num_agents_list[config],
+            "start_fire_pos": start_position(master_seed, run),
+        }
+
+    def to_rows(keys, results):
+        runs, configs = zip(*keys)
+        return ensemble_results(results, runs, configs)
+
+    def progress(adaptive):
+        runs = adaptive.stats.count.tolist()
+        print(f"Runs per config: {runs}, still needed: {adaptive.needed().tolist()}")
+
+    try:
+        adaptive.run(
+            make_params,
+            to_rows,
+            master_seed,
+            settings,
+            workers=workers,
+            progress=progress,
+            common=1 if common_random_numbers else None,
+        )
+    except KeyboardInterrupt:
+        print(f"Interrupted after {len(adaptive.rows)} simulations")
+    rows = sorted(adaptive.rows, key=lambda row: (row["Run"], row["Config"]))
+    return rows, adaptive.summary()
+
+
+# Вероятность того, что огонь коснётся больше threshold клеток сетки при
+# num_agents агентах. Точка возгорания у каждой траектории своя, из её
+# потока.
+def catastrophe_probability(
+    num_agents,
+    master_seed,
+    threshold=CATASTROPHE_THRESHOLD,
+    levels=SPLITTING_LEVELS,
+    effort=SPLITTING_EFFORT,
+    repeats=SPLITTING_REPEATS,
+):
+    def make_ensemble(rng):
+        return fire_ensemble.Ensemble(
+            GRID_SIZE,
+            num_agents,
+            [tuple(g.integers(0, GRID_SIZE, 2).tolist()) for g in rng],
+            FIRE_SPREAD_PROB,
+            WIND_DIRECTION,
+            WIND_STRENGTH,
+            RAIN_PROBABILITY,
+            FIRE_LIFE,
+            EXTINGUISH_AREA,
+            rng,
+            agent_mode=AGENT_MODE,
+        )
 
-    for t in threads:
-        t.start()
+    levels = [level for level in levels if level < threshold] + [threshold]
+    return fire_splitting.tail_probability(
+        make_ensemble, levels, effort, master_seed, repeats
+    )
 
-    for t in threads:
-        t.join()
 
-    results = []
-    while not result_queue.empty():
-        results.append(result_queue.get())
+# Перебор параметров axes по num_runs запусков на точку. Точка возгорания
+# запуска run общая для всех точек перебора. Ctrl-C или сбой не теряют
+# готовые задания: они уже в SWEEP_PATH.
+def run_sweep(axes, num_runs, samples=None, path=SWEEP_PATH, workers=WORKERS):
+    defaults = {
+        "spread_prob": FIRE_SPREAD_PROB,
+        "wind_direction": WIND_DIRECTION,
+        "wind_strength": WIND_STRENGTH,
+        "rain_probability": RAIN_PROBABILITY,
+        "extinguish_area": EXTINGUISH_AREA,
+    }
+    axes = dict({"num_agents": NUM_AGENTS_LIST}, **axes)
+    settings = {
+        "grid_size": GRID_SIZE,
+        "fire_life": FIRE_LIFE,
+        "agent_mode": AGENT_MODE,
+    }
 
-    return results
+    with fire_sweep.JobStore(path) as store:
+        master_seed = store.master_seed
+        if master_seed is None:
+            master_seed = (
+                MASTER_SEED if MASTER_SEED is not None else fire_rng.new_master_seed()
+            )
+        print(f"Master seed: {master_seed}")
+        if samples is None:
+            points = fire_sweep.grid(**axes)
+        else:
+            points = fire_sweep.latin_hypercube(samples, master_seed, **axes)
+        # Размер области тушения должен быть нечётным, как EXTINGUISH_AREA
+        areas = {point.get("extinguish_area", EXTINGUISH_AREA) for point in points}
+        even = sorted(area for area in areas if area % 2 == 0)
+        if even:
+            raise ValueError(
+                f"extinguish_area must be odd, got {even}; "
+                "use fire_sweep.Range(low, high, step=2) for odd sizes"
+            )
+        store.add(
+            [
+                (
+                    (point, run),
+                    dict(
+                        defaults,
+                        **params,
+                        start_fire_pos=start_position(master_seed, run),
+                    ),
+                )
+                for point, params in enumerate(points)
+                for run in range(num_runs)
+            ],
+            master_seed,
+        )
+
+        try:
+            fire_sweep.run_sweep(
+                store,
+                settings,
+                workers,
+                progress=lambda done, total: print(
+                    f"Finished {done}/{total} sweep jobs"
+                ),
+            )
+        except KeyboardInterrupt:
+            print(f"Interrupted: run again to resume the sweep from {path}")
+
+        return [
+            dict(
+                {name: row[name] for name in ("point", "run", *defaults)},
+                **make_result(
+                    row["num_agents"],
+                    row["total_burned_cells"],
+                    row["extinguished_cells"],
+                    row["total_steps_to_extinguish"],
+                    row["total_steps"],
+                    row["agent_moves"],
+                ),
+            )
+            for row in store.results()
+        ]
+
+
+# Повтор одного запуска серии без пересчёта всей серии
+def rerun_simulation(master_seed, run, config, num_agents_list=NUM_AGENTS_LIST):
+    results = fire_ensemble.Ensemble(
+        GRID_SIZE,
+        [num_agents_list[config]],
+        [start_position(master_seed, run)],
+        FIRE_SPREAD_PROB,
+        WIND_DIRECTION,
+        WIND_STRENGTH,
+        RAIN_PROBABILITY,
+        FIRE_LIFE,
+        EXTINGUISH_AREA,
+        [fire_rng.stream(master_seed, run, config)],
+        agent_mode=AGENT_MODE,
+    ).run()
+    return ensemble_results(results, [run], [config])[0]
+
+
+# "Что если" с шага branch_step: запуск run идёт до branch_step с
+# num_agents агентами, затем ветвится на num_agents_list (по num_branches
+# продолжений на вариант) без пересчёта общего начала
+def what_if_agents(
+    master_seed, run, num_agents, branch_step, num_agents_list, num_branches=1
+):
+    simulation = fire_simulation.Simulation(
+        GRID_SIZE,
+        num_agents,
+        fire_kernel.direction_probabilities(
+            FIRE_SPREAD_PROB, WIND_DIRECTION, WIND_STRENGTH
+        ),
+        RAIN_PROBABILITY,
+        FIRE_LIFE,
+        EXTINGUISH_AREA,
+        fire_rng.stream(master_seed, run, branch_step),
+        AGENT_MODE,
+    )
+    simulation.ignite(*start_position(master_seed, run))
+    simulation.advance(branch_step)
+
+    configs = np.repeat(np.arange(len(num_agents_list)), num_branches)
+    branches = np.tile(np.arange(num_branches), len(num_agents_list))
+    results = fire_ensemble.Ensemble.fork(
+        simulation,
+        len(configs),
+        fire_rng.streams(
+            master_seed,
+            [
+                (run, branch_step, c, b)
+                for c, b in zip(configs.tolist(), branches.tolist())
+            ],
+        ),
+        num_agents=np.asarray(num_agents_list)[configs],
+    ).run()
+    return ensemble_results(results, np.full(len(configs), run), configs)
+
+
+# Разности с первой конфигурацией по парам запусков на общих случайных числах
+def print_paired_differences(results, metrics=PAIRED_METRICS):
+    if COMMON_RANDOM_NUMBERS:
+        print(
+            pd.DataFrame(fire_adaptive.paired_differences(results, metrics)).to_string(
+                index=False
+            )
+        )
 
 
-def save_results_to_excel(results):
+def save_results_to_excel(results, path="fire_simulation_results.xlsx"):
     df = pd.DataFrame(results)
-    df.to_excel("fire_simulation_results.xlsx", index=False)
+    df.to_excel(path, index=False)
 
 
 def main():
     num_simulations = len(NUM_AGENTS_LIST)
     num_runs = 100  # Количество запусков симуляции
-    results = run_simulations(num_simulations, NUM_AGENTS_LIST, num_runs)
+    if SWEEP is not None:
+        results = run_sweep(SWEEP, num_runs, SWEEP_SAMPLES)
+        save_results_to_excel(results, "fire_sweep_results.xlsx")
+        print("Sweep results saved to fire_sweep_results.xlsx")
+        return
+    if SPLITTING:
+        master_seed = (
+            MASTER_SEED if MASTER_SEED is not None else fire_rng.new_master_seed()
+        )
+        print(f"Master seed: {master_seed}")
+        rows = []
+        for config, num_agents in enumerate(NUM_AGENTS_LIST):
+            estimate = catastrophe_probability(
+                num_agents, fire_rng.stream(master_seed, config).integers(2**32)
+            )
+            rows.append(
+                {
+                    "Number of Agents": num_agents,
+                    "Catastrophe probability": estimate["probability"],
+                    "CI half-width": estimate["ci_half_width"],
+                    "Simulations": estimate["simulations"],
+                }
+            )
+            print(rows[-1])
+        save_results_to_excel(rows, "fire_catastrophe_results.xlsx")
+        print("Catastrophe probabilities saved to fire_catastrophe_results.xlsx")
+        return
+    if ADAPTIVE:
+        master_seed = (
+            MASTER_SEED if MASTER_SEED is not None else fire_rng.new_master_seed()
+        )
+        print(f"Master seed: {master_seed}")
+        results, summary = run_simulations_adaptive(NUM_AGENTS_LIST, master_seed)
+        print(pd.DataFrame(summary).to_string(index=False))
+        print_paired_differences(results)
+        save_results_to_excel(results)
+        print("Simulation results saved to fire_simulation_results.xlsx")
+        return
+
+    master_seed = MASTER_SEED if MASTER_SEED is not None else fire_rng.new_master_seed()
+    checkpointed = WORKERS == 0
+    # Продолжение прерванной серии с тем же главным зерном
+    if checkpointed and CHECKPOINT_PATH is not None and os.path.exists(CHECKPOINT_PATH):
+        master_seed = fire_checkpoint.load(CHECKPOINT_PATH)[1]["master_seed"]
+    if not checkpointed and SERIES_PATH is not None and os.path.exists(SERIES_PATH):
+        with fire_sweep.JobStore(SERIES_PATH) as store:
+            if store.master_seed is not None:
+                master_seed = store.master_seed
+    print(f"Master seed: {master_seed}")
+    if checkpointed:
+        results = run_simulations(
+            num_simulations, NUM_AGENTS_LIST, num_runs, master_seed, CHECKPOINT_PATH
+        )
+    else:
+        results = run_simulations_parallel(
+            num_simulations, NUM_AGENTS_LIST, num_runs, master_seed, path=SERIES_PATH
+        )
+    print_paired_differences(results)
     save_results_to_excel(results)
     print("Simulation results saved to fire_simulation_results.xlsx")
 
@@ -2,36 +2,28 @@ import pygame
 import numpy as np
 import os
 
+import fire_render
+
 # Параметры
 GRID_SIZE = 50
 CELL_SIZE = 10
 SIMULATIONS = 50
 MAX_STEPS = 100
 
-# Цвета
-COLORS = {
-    0: (255, 255, 255),  # Негорящая область
-    1: (255, 0, 0),  # Огонь
-    3: (0, 0, 0),  # Сгоревшая область
-}
-
 # Инициализация Pygame
 pygame.init()
 screen = pygame.display.set_mode((GRID_SIZE * CELL_SIZE * 2, GRID_SIZE * CELL_SIZE))
 pygame.display.set_caption("Fire Simulation Data Viewer")
+# У каждой панели свой renderer: он помнит, что нарисовано в ней
+renderers = [
+    fire_render.GridRenderer((GRID_SIZE, GRID_SIZE), CELL_SIZE) for _ in range(2)
+]
 
 
-def draw_grid(grid, offset_x=0):
-    for y in range(GRID_SIZE):
-        for x in range(GRID_SIZE):
-            color = COLORS.get(
-                grid[y, x], (0, 0, 255)
-            )  # Синий цвет для неопределенных значений
-            pygame.draw.rect(
-                screen,
-                color,
-                (x * CELL_SIZE + offset_x, y * CELL_SIZE, CELL_SIZE, CELL_SIZE),
-            )
+def draw_grid(grid, panel=0):
+    return renderers[panel].draw_dirty(
+        screen, grid, offset=(panel * GRID_SIZE * CELL_SIZE, 0)
+    )
 
 
 def load_simulation_data(sim, step, data_type):
@@ -67,13 +59,11 @@ while running:
     new_sources = load_simulation_data(current_sim, current_step, "new")
 
     if current_grid is not None and new_sources is not None:
-        screen.fill((200, 200, 200))
-        draw_grid(current_grid, offset_x=0)
-        draw_grid(new_sources, offset_x=GRID_SIZE * CELL_SIZE)
+        dirty = draw_grid(current_grid, 0) + draw_grid(new_sources, 1)
         pygame.display.set_caption(
             f"Fire Simulation Data Viewer - Sim {current_sim}, Step {current_step}"
         )
-        pygame.display.flip()
+        pygame.display.update(dirty)
 
     clock.tick(5)  # Ограничение частоты обновления экрана для лучшей восприимчивости
 
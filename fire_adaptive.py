@@ -0,0 +1,230 @@
+from statistics import NormalDist
+
+import numpy as np
+
+import fire_batch
+
+# Адаптивное число запусков: запуски идут раундами, для каждой конфигурации
+# ведутся среднее и дисперсия выбранных метрик (онлайн, без хранения всех
+# значений), конфигурация останавливается, когда полуширина доверительного
+# интервала каждой метрики не больше целевой. Бюджет раунда делится между
+# незакончившимися конфигурациями пропорционально числу ещё нужных запусков,
+# поэтому больше запусков получают самые шумные. Запуск run конфигурации
+# config - задание fire_batch с ключом (run, config), то есть тот же запуск,
+# что и в обычной серии с тем же главным зерном.
+
+
+# Среднее и дисперсия по группам (конфигурациям) для нескольких метрик:
+# алгоритм Уэлфорда, пакет значений добавляется формулой Чана
+class RunningStats:
+    def __init__(self, groups, metrics):
+        self.count = np.zeros(groups, dtype=np.int64)
+        self.mean = np.zeros((groups, metrics))
+        self.m2 = np.zeros((groups, metrics))
+
+    # group - номера групп (n,), values - значения (n, metrics)
+    def add(self, group, values):
+        group = np.asarray(group, dtype=np.int64)
+        values = np.asarray(values, dtype=float).reshape(len(group), -1)
+        groups = len(self.count)
+        count = np.bincount(group, minlength=groups)
+        seen = count > 0
+        total = np.stack(
+            [np.bincount(group, v, minlength=groups) for v in values.T], -1
+        )
+        mean = np.divide(
+            total, count[:, None], out=np.zeros_like(total), where=seen[:, None]
+        )
+        m2 = np.stack(
+            [
+                np.bincount(group, (v - mean[group, j]) ** 2, minlength=groups)
+                for j, v in enumerate(values.T)
+            ],
+            -1,
+        )
+
+        n = self.count + count
+        delta = mean - self.mean
+        weight = np.divide(self.count * count, n, out=np.zeros(groups), where=n > 0)[
+            :, None
+        ]
+        self.m2 += m2 + delta**2 * weight
+        self.mean += (
+            delta * np.divide(count, n, out=np.zeros(groups), where=n > 0)[:, None]
+        )
+        self.count = n
+
+    # Выборочная дисперсия (n - 1), 0 при n < 2
+    def variance(self):
+        return self.m2 / np.maximum(self.count - 1, 1)[:, None]
+
+    # Полуширина доверительного интервала среднего (нормальное приближение)
+    def half_width(self, confidence=0.95):
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        return z * np.sqrt(self.variance() / np.maximum(self.count, 1)[:, None])
+
+
+# Адаптивная серия по num_configs конфигурациям. metrics - названия метрик
+# в строках результатов, target - целевая полуширина (одна на все метрики или
+# словарь по метрике). Конфигурация делает не меньше min_runs и не больше
+# max_runs запусков.
+class AdaptiveRuns:
+    def __init__(
+        self,
+        num_configs,
+        metrics,
+        target,
+        confidence=0.95,
+        min_runs=10,
+        max_runs=1000,
+    ):
+        self.metrics = list(metrics)
+        if isinstance(target, dict):
+            target = [target[name] for name in self.metrics]
+        self.target = np.broadcast_to(
+            np.asarray(target, dtype=float), (len(self.metrics),)
+        )
+        self.confidence = confidence
+        self.min_runs = min_runs
+        self.max_runs = max_runs
+        self.stats = RunningStats(num_configs, len(self.metrics))
+        # Номер следующего запуска каждой конфигурации
+        self.next_run = np.zeros(num_configs, dtype=np.int64)
+        self.rows = []
+
+    # Сколько ещё запусков нужно каждой конфигурации по текущей оценке
+    # дисперсии: n = (z * s / target)^2, но не меньше min_runs и не больше
+    # max_runs
+    def needed(self):
+        z = NormalDist().inv_cdf(0.5 + self.confidence / 2)
+        runs = np.ceil(self.stats.variance() * (z / self.target) ** 2).max(axis=1)
+        runs = np.clip(runs, self.min_runs, self.max_runs).astype(np.int64)
+        return np.maximum(runs - self.stats.count, 0)
+
+    # Конфигурации с полушириной не больше целевой по всем метрикам
+    def converged(self):
+        half_width = self.stats.half_width(self.confidence)
+        return (self.stats.count >= self.min_runs) & (half_width <= self.target).all(
+            axis=1
+        )
+
+    # Ключи (run, config) следующего раунда: budget запусков делятся между
+    # конфигурациями пропорционально needed(), каждой незакончившейся - хотя
+    # бы один
+    def plan(self, budget):
+        needed = self.needed()
+        share = needed
+        if needed.sum() > budget:
+            share = np.maximum(needed * budget // needed.sum(), needed > 0)
+        keys = [
+            (run, config)
+            for config in np.flatnonzero(share).tolist()
+            for run in range(
+                int(self.next_run[config]), int(self.next_run[config] + share[config])
+            )
+        ]
+        self.next_run += share
+        return keys
+
+    # Строки результатов: словари с номером конфигурации "Config" и
+    # значениями метрик
+    def add(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        self.rows.extend(rows)
+        self.stats.add(
+            [row["Config"] for row in rows],
+            [[row[name] for name in self.metrics] for row in rows],
+        )
+
+    # Раунды до сходимости всех конфигураций. make_params(run, config) -
+    # параметры задания fire_batch, to_rows(keys, results) - строки
+    # результатов пакета. budget - запусков за раунд; None - столько же,
+    # сколько сделано до раунда (не меньше min_runs на конфигурацию), то есть
+    # число раундов растёт как логарифм числа запусков. common - как в
+    # fire_batch.run_batch(). Если раунд прерван, готовые пакеты уже учтены.
+    def run(
+        self,
+        make_params,
+        to_rows,
+        master_seed,
+        settings,
+        budget=None,
+        workers=None,
+        progress=None,
+        common=None,
+    ):
+        while True:
+            keys = self.plan(
+                budget
+                if budget is not None
+                else max(len(self.stats.count) * self.min_runs, self.stats.count.sum())
+            )
+            if not keys:
+                break
+            jobs = [(key, make_params(*key)) for key in keys]
+            for chunk_keys, results in fire_batch.run_batch(
+                jobs, master_seed, settings, workers, common=common
+            ):
+                self.add(to_rows(chunk_keys, results))
+            if progress is not None:
+                progress(self)
+        return self.rows
+
+    # Итог по конфигурациям: число запусков, среднее и полуширина каждой
+    # метрики, сошлась ли конфигурация
+    def summary(self):
+        half_width = self.stats.half_width(self.confidence)
+        converged = self.converged()
+        return [
+            dict(
+                {"Config": config, "Runs": int(self.stats.count[config])},
+                **{
+                    key: float(value)
+                    for j, name in enumerate(self.metrics)
+                    for key, value in (
+                        (name, self.stats.mean[config, j]),
+                        (f"{name} CI half-width", half_width[config, j]),
+                    )
+                },
+                Converged=bool(converged[config]),
+            )
+            for config in range(len(self.stats.count))
+        ]
+
+
+# Парные разности метрик каждой конфигурации с конфигурацией baseline по
+# запускам с одинаковым "Run" (при общих случайных числах - один и тот же
+# пожар). Для сравнения дана полуширина интервала, которая была бы у
+# разности средних по независимым запускам того же числа.
+def paired_differences(rows, metrics, baseline=0, confidence=0.95):
+    by_key = {(row["Run"], row["Config"]): row for row in rows}
+    configs = sorted({config for _, config in by_key} - {baseline})
+    summary = []
+    for config in configs:
+        runs = sorted(
+            run for run, c in by_key if c == config and (run, baseline) in by_key
+        )
+        values = np.array(
+            [
+                [[by_key[run, c][name] for name in metrics] for c in (config, baseline)]
+                for run in runs
+            ],
+            dtype=float,
+        ).reshape(len(runs), 2, len(metrics))
+        pairs = RunningStats(1, len(metrics))
+        pairs.add(np.zeros(len(runs)), values[:, 0] - values[:, 1])
+        single = RunningStats(2, len(metrics))
+        single.add(np.tile([0, 1], len(runs)), values.reshape(-1, len(metrics)))
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        unpaired = z * np.sqrt(single.variance().sum(axis=0) / max(len(runs), 1))
+        half_width = pairs.half_width(confidence)[0]
+
+        row = {"Config": config, "Baseline": baseline, "Pairs": len(runs)}
+        for j, name in enumerate(metrics):
+            row[f"{name} difference"] = float(pairs.mean[0, j])
+            row[f"{name} difference CI half-width"] = float(half_width[j])
+            row[f"{name} unpaired CI half-width"] = float(unpaired[j])
+        summary.append(row)
+    return summary
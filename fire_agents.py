@@ -0,0 +1,247 @@
+import numpy as np
+
+import fire_kernel
+
+# Поле ближайшего огня: для каждой клетки - номер (y * W + x) ближайшей
+# горящей клетки по евклидову расстоянию. При равенстве выбирается последняя
+# клетка по строкам, как в старом move_agents() со словарём расстояний.
+# Считается одним проходом по столбцам и одним по строкам. Второй проход
+# можно ограничить точками, где стоят агенты: тогда поле считается только
+# там, где его будут читать.
+
+# Ограничение на размер промежуточного массива второго прохода (элементы)
+CHUNK_SIZE = 1 << 22
+
+
+# burning - маска (H, W) или пачка масок (R, H, W). Возвращает (квадрат
+# расстояния, номер клетки в своей сетке) для всех клеток или только для
+# точек (ys, xs) формы (R, ...) у пачки; без огня - (-1, -1).
+def nearest_fire(burning, ys=None, xs=None):
+    height, width = burning.shape[-2:]
+    batch = burning.shape[:-2]
+    burning = burning.reshape((-1, height, width))
+    rows = np.arange(height)[:, None]
+
+    # Проход по столбцам: ближайшая горящая клетка в своём столбце сверху
+    # и снизу; при равенстве берётся нижняя (более поздняя по строкам)
+    above = np.maximum.accumulate(np.where(burning, rows, -1), axis=1)
+    below = np.minimum.accumulate(np.where(burning, rows, height)[:, ::-1], axis=1)[
+        :, ::-1
+    ]
+    up = np.where(above >= 0, rows - above, height + width)
+    down = np.where(below < height, below - rows, height + width)
+    column_row = np.where(down <= up, below, above)
+    column_dist = np.minimum(up, down)
+
+    if ys is None:
+        ys, xs = np.divmod(np.arange(height * width), width)
+        ys = np.broadcast_to(ys, batch + ys.shape)
+        xs = np.broadcast_to(xs, batch + xs.shape)
+        shape = batch + (height, width)
+    else:
+        ys = np.asarray(ys)
+        xs = np.asarray(xs)
+        shape = ys.shape
+    replica = np.repeat(np.arange(len(burning)), ys.size // len(burning))
+    ys = ys.reshape(-1)
+    xs = xs.reshape(-1)
+
+    # Проход по строкам: минимум (x - x')^2 + g(y, x')^2 по столбцам x'
+    # с ключом как в move_agents(): расстояние, затем поздняя клетка.
+    # Столбцы без огня в своей реплике дают расстояние больше любого
+    # настоящего и выбираются, только если огня в реплике нет совсем.
+    cells = height * width
+    columns = np.flatnonzero(burning.any(axis=(0, 1)))
+    dist2 = np.full(len(ys), -1, dtype=np.int64)
+    index = np.full(len(ys), -1, dtype=np.int64)
+    if len(columns) == 0:
+        return dist2.reshape(shape), index.reshape(shape)
+    step = max(1, CHUNK_SIZE // len(columns))
+    for p0 in range(0, len(ys), step):
+        r = replica[p0 : p0 + step]
+        y = ys[p0 : p0 + step]
+        g = column_dist[r, y][:, columns].astype(np.int64)
+        cell = column_row[r, y][:, columns] * width + columns
+        key = ((xs[p0 : p0 + step, None] - columns) ** 2 + g**2) * cells + (
+            cells - 1 - cell
+        )
+        best = key.min(axis=1)
+        dist2[p0 : p0 + step] = best // cells
+        index[p0 : p0 + step] = cells - 1 - best % cells
+    empty = ~burning.any(axis=(1, 2))[replica]
+    dist2[empty] = -1
+    index[empty] = -1
+    return dist2.reshape(shape), index.reshape(shape)
+
+
+# Ход всех агентов одновременно, без цикла по агентам: цели по полю
+# ближайшего огня на начало хода, шаг к цели с ограничением сеткой, тушение
+# объединения окон extinguish_area вокруг позиций до хода. Клетка, которую
+# накрывают несколько окон, засчитывается агенту с меньшим номером.
+# В отличие от последовательного move_agents(), агенты не видят тушения
+# друг друга в этом ходу. grid - сетка состояний (H, W), меняется на месте.
+# Возвращает (цели (N, 2), номера потушенных клеток).
+def move_agents_simultaneous(
+    grid, agents, agent_moves, extinguished_by_agent, extinguish_area
+):
+    height, width = grid.shape
+    n = len(agents)
+    targets = np.full((n, 2), -1)
+    burning = grid == fire_kernel.BURNING
+    if n == 0 or not burning.any():
+        return targets, np.empty(0, dtype=np.int64)
+
+    x = agents[:, 0].copy()
+    y = agents[:, 1].copy()
+    _, nearest = nearest_fire(burning, y, x)
+    ty, tx = np.divmod(nearest, width)
+    targets[:, 0] = tx
+    targets[:, 1] = ty
+    agents[:, 0] = np.clip(x + np.where(tx > x, 1, -1), 0, width - 1)
+    agents[:, 1] = np.clip(y + np.where(ty > y, 1, -1), 0, height - 1)
+    agent_moves += 1
+
+    owner_cells, owner = footprint_owners(height, width, y, x, extinguish_area)
+    hit = burning.reshape(-1)[owner_cells]
+    cells = owner_cells[hit]
+    grid.reshape(-1)[cells] = fire_kernel.BURNED
+    extinguished_by_agent += np.bincount(owner[hit], minlength=n)
+    return targets, cells
+
+
+# Клетки под окнами агентов и номер агента-владельца каждой клетки (меньший
+# номер из накрывающих). Мало агентов - окна перебираются напрямую; много -
+# минимальный номер агента растягивается на окно раздельным минимум-фильтром
+# по строкам и столбцам (расширение позиций агентов), без перебора окон.
+def footprint_owners(height, width, y, x, extinguish_area):
+    n = len(y)
+    half = extinguish_area // 2
+    if n * extinguish_area**2 <= height * width:
+        # Окна по порядку номеров: первое вхождение клетки - окно агента
+        # с наименьшим номером
+        offsets = np.arange(-half, half + 1)
+        fy = y[:, None, None] + offsets[None, :, None]
+        fx = x[:, None, None] + offsets[None, None, :]
+        agent, fy, fx = np.broadcast_arrays(np.arange(n)[:, None, None], fy, fx)
+        inside = (fy >= 0) & (fy < height) & (fx >= 0) & (fx < width)
+        cells, first = np.unique(fy[inside] * width + fx[inside], return_index=True)
+        return cells, agent[inside][first]
+
+    owner = np.full((height, width), n, dtype=np.int64)
+    np.minimum.at(owner, (y, x), np.arange(n))
+    for axis in (0, 1):
+        spread = owner.copy()
+        for off in range(1, half + 1):
+            ahead = [slice(None)] * 2
+            behind = [slice(None)] * 2
+            ahead[axis] = slice(off, None)
+            behind[axis] = slice(None, -off)
+            np.minimum(
+                spread[tuple(behind)], owner[tuple(ahead)], out=spread[tuple(behind)]
+            )
+            np.minimum(
+                spread[tuple(ahead)], owner[tuple(behind)], out=spread[tuple(ahead)]
+            )
+        owner = spread
+    cells = np.flatnonzero(owner < n)
+    return cells, owner.reshape(-1)[cells]
+
+
+# Пространственный хэш: сетка корзин bucket_size x bucket_size, в каждой -
+# словарь ключ -> (y, x). Ключи - номера клеток (y * W + x) для горящих
+# клеток или номера агентов. Вставка, удаление и перемещение стоят O(1) на
+# объект, поэтому индекс обновляется по мере поджогов, выгорания и ходов
+# агентов, без перестройки. Запросы смотрят только соседние корзины.
+class SpatialHash:
+    def __init__(self, height, width, bucket_size=8):
+        self.height = height
+        self.width = width
+        self.bucket_size = bucket_size
+        self.rows = -(-height // bucket_size)
+        self.cols = -(-width // bucket_size)
+        self.buckets = {}
+        self.where = {}
+
+    def __len__(self):
+        return len(self.where)
+
+    def __contains__(self, key):
+        return key in self.where
+
+    def _bucket(self, ys, xs):
+        return (np.asarray(ys) // self.bucket_size) * self.cols + (
+            np.asarray(xs) // self.bucket_size
+        )
+
+    def insert(self, keys, ys, xs):
+        for key, y, x, b in zip(
+            np.atleast_1d(keys).tolist(),
+            np.atleast_1d(ys).tolist(),
+            np.atleast_1d(xs).tolist(),
+            np.atleast_1d(self._bucket(ys, xs)).tolist(),
+        ):
+            old = self.where.get(key)
+            if old is not None and old != b:
+                del self.buckets[old][key]
+            self.buckets.setdefault(b, {})[key] = (y, x)
+            self.where[key] = b
+
+    def remove(self, keys):
+        for key in np.atleast_1d(keys).tolist():
+            b = self.where.pop(key, None)
+            if b is not None:
+                bucket = self.buckets[b]
+                del bucket[key]
+                if not bucket:
+                    del self.buckets[b]
+
+    # Новые позиции; корзина меняется только у перешедших границу
+    def move(self, keys, ys, xs):
+        self.insert(keys, ys, xs)
+
+    def _gather(self, by0, by1, bx0, bx1):
+        keys, ys, xs = [], [], []
+        for by in range(max(by0, 0), min(by1, self.rows - 1) + 1):
+            for bx in range(max(bx0, 0), min(bx1, self.cols - 1) + 1):
+                bucket = self.buckets.get(by * self.cols + bx)
+                if bucket:
+                    keys.extend(bucket)
+                    for y, x in bucket.values():
+                        ys.append(y)
+                        xs.append(x)
+        return (
+            np.array(keys, dtype=np.int64),
+            np.array(ys, dtype=np.int64),
+            np.array(xs, dtype=np.int64),
+        )
+
+    # Объекты в круге радиуса radius вокруг (y, x): (ключи, ys, xs)
+    def within(self, y, x, radius):
+        b = self.bucket_size
+        keys, ys, xs = self._gather(
+            (y - radius) // b, (y + radius) // b, (x - radius) // b, (x + radius) // b
+        )
+        inside = (ys - y) ** 2 + (xs - x) ** 2 <= radius**2
+        return keys[inside], ys[inside], xs[inside]
+
+    # k ближайших к (y, x) объектов, по возрастанию расстояния (при равенстве
+    # - больший ключ раньше, как поздняя клетка в move_agents()). Корзины
+    # просматриваются кольцами, пока k-й найденный не ближе непросмотренных.
+    def nearest(self, y, x, k=1):
+        b = self.bucket_size
+        by, bx = y // b, x // b
+        ring = 0
+        while True:
+            keys, ys, xs = self._gather(by - ring, by + ring, bx - ring, bx + ring)
+            d2 = (ys - y) ** 2 + (xs - x) ** 2
+            order = np.lexsort((-keys, d2))[:k]
+            covered = ring * b
+            done = len(keys) == len(self) or (
+                by - ring <= 0
+                and bx - ring <= 0
+                and by + ring >= self.rows - 1
+                and bx + ring >= self.cols - 1
+            )
+            if done or (len(order) == k and d2[order[-1]] <= covered**2):
+                return keys[order], ys[order], xs[order]
+            ring += 1
@@ -0,0 +1,116 @@
+import multiprocessing
+import signal
+
+import fire_ensemble
+import fire_rng
+
+# Серия запусков без окон на пуле процессов по числу ядер. Задание - (ключ,
+# параметры), ключ - например (run, config), параметры - словарь аргументов
+# Ensemble этого запуска (как минимум num_agents и start_fire_pos). Задания
+# режутся на пакеты по chunk_size, каждый пакет считается в процессе пула
+# одним ансамблем (fire_ensemble.Ensemble), поэтому в один пакет попадают
+# только задания с одинаковыми общими для ансамбля параметрами (всё, кроме
+# REPLICA_ARGS). У каждого задания свой поток fire_rng.stream(master_seed,
+# *ключ), поэтому результат не зависит ни от числа процессов, ни от того, в
+# какой пакет попало задание. С common задания с одинаковым началом ключа
+# key[:common] (например, один run для разных config) получают общие
+# случайные числа fire_rng.CommonStream(master_seed, *key[:common]).
+
+# Пакетов на процесс при chunk_size=None: мелкие пакеты выравнивают нагрузку,
+# крупные лучше векторизуются
+CHUNKS_PER_WORKER = 4
+
+# Аргументы Ensemble, которые могут быть своими у каждой реплики пакета
+REPLICA_ARGS = (
+    "num_agents",
+    "start_fire_pos",
+    "spread_prob",
+    "wind_direction",
+    "wind_strength",
+    "rain_probability",
+)
+
+# Параметры серии в процессе пула: задаются один раз при запуске процесса,
+# а не передаются с каждым пакетом
+_master_seed = None
+_settings = None
+_common = None
+
+
+def _init_worker(master_seed, settings, common):
+    global _master_seed, _settings, _common
+    # Ctrl-C обрабатывает только главный процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _master_seed = master_seed
+    _settings = settings
+    _common = common
+
+
+# Один пакет заданий; settings - аргументы Ensemble, общие для всей серии
+# (grid_size, fire_life, ..., agent_mode), параметры заданий их дополняют.
+# Возвращает (ключи, results ансамбля). Ансамбль строится заново для каждого
+# пакета: построение (в основном потоки и места агентов реплик) занимает около
+# 1% времени пакета, а сетку ансамбль всё равно заменяет при выбытии реплик,
+# так что общие буферы процесса ничего бы не дали.
+def run_chunk(chunk, master_seed, settings, common=None):
+    keys = [key for key, _ in chunk]
+    args = dict(settings)
+    for name in chunk[0][1]:
+        values = [params[name] for _, params in chunk]
+        args[name] = values if name in REPLICA_ARGS else values[0]
+    if common is None:
+        rng = fire_rng.streams(master_seed, keys)
+    else:
+        rng = fire_rng.common_streams(master_seed, [key[:common] for key in keys])
+    ensemble = fire_ensemble.Ensemble(rng=rng, **args)
+    return keys, ensemble.run()
+
+
+# Задания по пакетам не больше chunk_size, в пакете - одинаковые общие
+# параметры
+def make_chunks(jobs, chunk_size):
+    groups = {}
+    for key, params in jobs:
+        shared = tuple(
+            (name, value)
+            for name, value in sorted(params.items())
+            if name not in REPLICA_ARGS
+        )
+        groups.setdefault(shared, []).append((key, params))
+    return [
+        group[i : i + chunk_size]
+        for group in groups.values()
+        for i in range(0, len(group), chunk_size)
+    ]
+
+
+def _run_chunk(chunk):
+    return run_chunk(chunk, _master_seed, _settings, _common)
+
+
+# Генератор результатов (ключи, results) по мере готовности пакетов, в
+# порядке завершения. workers=None - по числу ядер, 0 - в текущем процессе.
+# При Ctrl-C или закрытии генератора процессы пула останавливаются, уже
+# полученные пакеты остаются у вызывающего кода.
+def run_batch(jobs, master_seed, settings, workers=None, chunk_size=None, common=None):
+    jobs = list(jobs)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if chunk_size is None:
+        parts = workers * CHUNKS_PER_WORKER if workers else 1
+        chunk_size = max(1, -(-len(jobs) // parts))
+    chunks = make_chunks(jobs, chunk_size)
+    workers = min(workers, len(chunks))
+
+    if not workers:
+        for chunk in chunks:
+            yield run_chunk(chunk, master_seed, settings, common)
+        return
+
+    pool = multiprocessing.Pool(workers, _init_worker, (master_seed, settings, common))
+    try:
+        yield from pool.imap_unordered(_run_chunk, chunks)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
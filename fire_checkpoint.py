@@ -0,0 +1,119 @@
+import importlib
+import json
+import os
+
+import numpy as np
+
+import fire_rng
+
+# Снимок движка (SparseFire, Simulation, Ensemble) в одном файле .npz: массивы
+# хранятся сжатыми, скаляры и состояние генераторов случайных чисел - в JSON
+# под ключом __meta__. Движок после load() продолжает расчёт бит в бит так же,
+# как продолжил бы исходный. Движок должен иметь state_dict() и from_state().
+# fire_rng.CommonStream хранится вместе с зерном и счётчиком выборок клеток.
+_META = "__meta__"
+
+
+def _encode_rng(rng):
+    def encode(value):
+        if isinstance(value, dict):
+            return {k: encode(v) for k, v in value.items()}
+        if isinstance(value, np.ndarray):
+            return {"__array__": value.tolist(), "dtype": value.dtype.str}
+        return value
+
+    if isinstance(rng, fire_rng.CommonStream):
+        return dict(
+            _encode_rng(rng.generator),
+            __common__={"seed": rng.seed, "draws": rng.draws},
+        )
+    return {"__rng__": encode(rng.bit_generator.state)}
+
+
+def _decode_rng(meta):
+    def decode(value):
+        if isinstance(value, dict):
+            if "__array__" in value:
+                return np.array(value["__array__"], dtype=value["dtype"])
+            return {k: decode(v) for k, v in value.items()}
+        return value
+
+    state = decode(meta["__rng__"])
+    bit_generator = getattr(np.random, state["bit_generator"])()
+    bit_generator.state = state
+    generator = np.random.Generator(bit_generator)
+    if "__common__" not in meta:
+        return generator
+    stream = fire_rng.CommonStream.__new__(fire_rng.CommonStream)
+    stream.generator = generator
+    stream.seed = meta["__common__"]["seed"]
+    stream.draws = meta["__common__"]["draws"]
+    return stream
+
+
+# Вложенные словари разворачиваются в ключи вида "fire/grid"
+def _flatten(state, prefix=""):
+    arrays, meta = {}, {}
+    for name, value in state.items():
+        key = prefix + name
+        if isinstance(value, dict):
+            sub_arrays, sub_meta = _flatten(value, key + "/")
+            arrays.update(sub_arrays)
+            meta.update(sub_meta)
+        elif isinstance(value, np.ndarray):
+            arrays[key] = value
+        elif isinstance(value, (np.random.Generator, fire_rng.CommonStream)):
+            meta[key] = _encode_rng(value)
+        elif isinstance(value, list):
+            meta[key] = [_encode_rng(g) for g in value]
+        elif isinstance(value, np.generic):
+            meta[key] = value.item()
+        else:
+            meta[key] = value
+    return arrays, meta
+
+
+def _unflatten(items):
+    state = {}
+    for key, value in items:
+        *path, name = key.split("/")
+        node = state
+        for part in path:
+            node = node.setdefault(part, {})
+        node[name] = value
+    return state
+
+
+def _restore(value):
+    if isinstance(value, dict) and "__rng__" in value:
+        return _decode_rng(value)
+    if isinstance(value, list):
+        return [_decode_rng(g) for g in value]
+    return value
+
+
+# Атомарная запись: файл сначала пишется рядом, затем подменяет старый снимок,
+# поэтому падение процесса во время записи не портит предыдущий снимок.
+# extra - дополнительные данные вызывающего кода (номер пакета, результаты).
+def save(path, engine, **extra):
+    arrays, meta = _flatten({"engine": engine.state_dict(), "extra": extra})
+    meta[_META] = type(engine).__module__ + "." + type(engine).__qualname__
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, **arrays, **{_META: np.array(json.dumps(meta))})
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    with np.load(path) as data:
+        meta = json.loads(str(data[_META]))
+        items = [(key, data[key]) for key in data.files if key != _META]
+    engine_type = meta.pop(_META)
+    items += [(key, _restore(value)) for key, value in meta.items()]
+    state = _unflatten(items)
+
+    module, name = engine_type.rsplit(".", 1)
+    engine = getattr(importlib.import_module(module), name).from_state(
+        state.get("engine", {})
+    )
+    return engine, state.get("extra", {})
@@ -0,0 +1,174 @@
+import numpy as np
+
+import fire_kernel
+import fire_rng
+import fire_state
+
+# Распространение огня по произвольному ядру поджога. kernel[дождь] - массив
+# (2R+1, 2R+1): вероятность, что горящая клетка подожжёт клетку со сдвигом
+# (dy, dx) = (i - R, j - R). Пары источник-цель независимы, поэтому клетка
+# загорается с вероятностью 1 - prod(1 - kernel), а сумма логарифмов по всем
+# источникам - это свёртка горящей маски с log(1 - kernel). Случайное число
+# нужно одно на клетку-цель, а не на пару. Для ядра фон Неймана результат
+# совпадает по распределению с fire_kernel.spread_fire().
+
+# Ядра с числом ненулевых элементов до STENCIL_MAX_TAPS считаются прямым
+# суммированием сдвигов, большие - через FFT
+STENCIL_MAX_TAPS = 25
+
+
+# Ядро фон Неймана из direction_probabilities(): форма (2, 3, 3)
+def von_neumann(spread_prob, wind_direction, wind_strength):
+    probs = fire_kernel.direction_probabilities(
+        spread_prob, wind_direction, wind_strength
+    ).reshape(2, len(fire_kernel.DIRECTIONS))
+    kernel = np.zeros((2, 3, 3))
+    for d, (dy, dx) in enumerate(fire_kernel.DIRECTIONS):
+        kernel[:, 1 + dy, 1 + dx] = probs[:, d]
+    return kernel
+
+
+# Окрестность Мура: диагональные соседи с множителем diagonal
+def moore(spread_prob, wind_direction, wind_strength, diagonal=2**-0.5):
+    kernel = von_neumann(spread_prob, wind_direction, wind_strength)
+    wind = np.array(fire_kernel.DIRECTIONS[fire_kernel.WIND_DIRECTIONS[wind_direction]])
+    for dy in (-1, 1):
+        for dx in (-1, 1):
+            bonus = wind_strength * max(0.0, wind @ (dy, dx)) * diagonal
+            kernel[0, 1 + dy, 1 + dx] = spread_prob * diagonal + bonus
+            kernel[1, 1 + dy, 1 + dx] = spread_prob * 0.5 * diagonal + bonus
+    return kernel
+
+
+# Эллипс по ветру радиуса radius: вероятность spread_prob * exp(-r / scale),
+# где r - расстояние в координатах, растянутых вдоль ветра в (1 + stretch) раз
+# и сдвинутых по ветру. wind - вектор (dy, dx), куда дует ветер.
+def wind_ellipse(spread_prob, radius, wind, stretch=1.0, scale=1.0):
+    dy, dx = np.mgrid[-radius : radius + 1, -radius : radius + 1].astype(float)
+    wind = np.asarray(wind, dtype=float)
+    norm = np.hypot(*wind)
+    along = (dy * wind[0] + dx * wind[1]) / norm if norm else np.zeros_like(dy)
+    across = np.sqrt(np.maximum(dy**2 + dx**2 - along**2, 0.0))
+    shift = norm * stretch
+    r = np.hypot((along - shift) / (1.0 + norm * stretch), across)
+    kernel = spread_prob * np.exp(-r / scale)
+    kernel[radius, radius] = 0.0
+    return np.stack([kernel, kernel * 0.5])
+
+
+# Заброс искр на расстояние до radius: вероятность убывает как
+# probability * exp(-d / decay), ближайшие соседи (d <= 1) не входят
+def ember_spotting(probability, radius, decay=None):
+    decay = radius / 3 if decay is None else decay
+    dy, dx = np.mgrid[-radius : radius + 1, -radius : radius + 1]
+    d = np.hypot(dy, dx)
+    kernel = np.where((d > 1) & (d <= radius), probability * np.exp(-d / decay), 0.0)
+    return np.stack([kernel, kernel])
+
+
+# Объединение независимых механизмов поджога в одно ядро
+def combine(*kernels):
+    radius = max(k.shape[-1] // 2 for k in kernels)
+    keep = np.ones((2, 2 * radius + 1, 2 * radius + 1))
+    for kernel in kernels:
+        r = kernel.shape[-1] // 2
+        keep[:, radius - r : radius + r + 1, radius - r : radius + r + 1] *= 1 - kernel
+    return 1 - keep
+
+
+# Ближайший размер >= n вида 2^a 3^b 5^c, на котором FFT быстрее всего
+def _fast_size(n):
+    best = 2 * n
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p235 = p35
+            while p235 < n:
+                p235 *= 2
+            best = min(best, p235)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+# Свёртка масок (..., H, W) с ядром (2R+1, 2R+1) того же размера на выходе
+def convolve(mask, kernel, method="auto"):
+    taps = np.argwhere(kernel != 0)
+    if method == "auto":
+        method = "stencil" if len(taps) <= STENCIL_MAX_TAPS else "fft"
+    radius = kernel.shape[-1] // 2
+    mask = mask.astype(float)
+
+    if method == "stencil":
+        out = np.zeros(mask.shape)
+        for i, j in taps:
+            out += kernel[i, j] * fire_kernel.shift(mask, i - radius, j - radius)
+        return out
+
+    h, w = mask.shape[-2:]
+    size = (_fast_size(h + 2 * radius), _fast_size(w + 2 * radius))
+    spectrum = np.fft.rfft2(mask, size) * np.fft.rfft2(kernel, size)
+    return np.fft.irfft2(spectrum, size)[..., radius : radius + h, radius : radius + w]
+
+
+# Клетки, которые загорятся на этом шаге, от горящих клеток active
+def ignition_targets(active, fuel, kernel, rain_probability, rng, method="auto"):
+    cells = np.nonzero(active)
+    draws = fire_rng.draw(rng, cells[0], 1, cells[-2], cells[-1], active.shape[-1])
+    rain = draws[0] < np.broadcast_to(rain_probability, active.shape)[cells]
+
+    log_keep = np.zeros(active.shape)
+    for wet in (False, True):
+        sources = np.zeros(active.shape, dtype=bool)
+        sources[tuple(c[rain == wet] for c in cells)] = True
+        if sources.any():
+            log_keep += convolve(
+                sources, np.log1p(-np.minimum(kernel[int(wet)], 1.0 - 1e-12)), method
+            )
+
+    candidates = np.nonzero(fuel & (log_keep < -1e-12))
+    p = -np.expm1(np.minimum(log_keep[candidates], 0.0))
+    hit = (
+        fire_rng.draw(
+            rng, candidates[0], 1, candidates[-2], candidates[-1], active.shape[-1]
+        )[0]
+        < p
+    )
+    targets = np.zeros(active.shape, dtype=bool)
+    targets[tuple(c[hit] for c in candidates)] = True
+    ignitions = np.count_nonzero(targets, axis=(-2, -1))
+    return targets, ignitions
+
+
+# То же, что fire_kernel.spread_fire(), но с ядром поджога. Поджоги
+# считаются по загоревшимся клеткам, а не по парам источник-цель.
+def spread_fire(grid, fire_duration, kernel, rain_probability, fire_life, rng):
+    burning = grid == fire_kernel.BURNING
+    fire_duration[burning] += 1
+    burned_out = burning & (fire_duration > fire_life)
+    active = burning & ~burned_out
+    fuel = grid == fire_kernel.FUEL
+
+    new_grid = grid.copy()
+    new_grid[burned_out] = fire_kernel.BURNED
+    targets, ignitions = ignition_targets(active, fuel, kernel, rain_probability, rng)
+    new_grid[targets] = fire_kernel.BURNING
+
+    return new_grid, ignitions
+
+
+# То же, что fire_state.spread_fire_packed(), но с ядром поджога
+def spread_fire_packed(cells, kernel, rain_probability, fire_life, rng):
+    grid = fire_state.state(cells)
+    burning = grid == fire_kernel.BURNING
+    fuel = grid == fire_kernel.FUEL
+
+    cells[burning] += 1 << fire_state.AGE_SHIFT
+    burned_out = burning & (fire_state.age(cells) > fire_life)
+    active = burning & ~burned_out
+
+    targets, ignitions = ignition_targets(active, fuel, kernel, rain_probability, rng)
+    cells[burned_out] += fire_kernel.BURNED - fire_kernel.BURNING
+    cells[targets] = fire_kernel.BURNING
+    return ignitions
@@ -0,0 +1,612 @@
+import hashlib
+import os
+
+import numpy as np
+
+import fire_checkpoint
+import fire_convolve
+import fire_kernel
+import fire_policy
+import fire_state
+
+# Счётчики, которые ансамбль ведёт для каждой реплики
+COUNTERS = (
+    "total_burned_cells",
+    "extinguished_cells",
+    "total_steps_to_extinguish",
+    "total_steps",
+)
+
+
+# Ансамбль из R независимых симуляций, которые хранятся как массивы (R, H, W)
+# и продвигаются одним векторизованным шагом. Параметры задаются векторами
+# длины R (или скалярами для всех реплик). Завершившиеся реплики выбывают из
+# рабочих массивов, их результаты остаются в self.results. kernel - общее для
+# всех реплик ядро поджога fire_convolve (тогда spread_prob и ветер не
+# используются для распространения). agent_mode - "sequential" (move_agents()
+# ниже) или политика fire_policy.POLICIES, которая ходит всеми агентами сразу.
+class Ensemble:
+    agent_mode = "sequential"
+
+    def __init__(
+        self,
+        grid_size,
+        num_agents,
+        start_fire_pos,
+        spread_prob,
+        wind_direction,
+        wind_strength,
+        rain_probability,
+        fire_life,
+        extinguish_area,
+        rng,
+        kernel=None,
+        agent_mode="sequential",
+    ):
+        fire_state.check_fire_life(fire_life)
+        start_fire_pos = np.asarray(start_fire_pos, dtype=int).reshape(-1, 2)
+        num_agents = np.asarray(num_agents, dtype=int)
+        r = np.broadcast_shapes(
+            num_agents.shape,
+            start_fire_pos.shape[:1],
+            np.shape(spread_prob),
+            np.shape(wind_direction),
+            np.shape(wind_strength),
+            np.shape(rain_probability),
+            np.shape(rng) if isinstance(rng, list) else (),
+        )[0]
+        num_agents = np.broadcast_to(num_agents, (r,))
+        start_fire_pos = np.broadcast_to(start_fire_pos, (r, 2))
+
+        self.grid_size = grid_size
+        self.fire_life = fire_life
+        self.extinguish_area = extinguish_area
+        self.rng = rng
+        self.kernel = kernel
+        self.agent_mode = agent_mode
+        self.size = r
+
+        self.probs = np.broadcast_to(
+            fire_kernel.direction_probabilities(
+                np.broadcast_to(spread_prob, (r,)),
+                np.broadcast_to(wind_direction, (r,)),
+                np.broadcast_to(wind_strength, (r,)),
+            ),
+            (2, len(fire_kernel.DIRECTIONS), r, 1, 1),
+        ).copy()
+        self.rain_probability = np.broadcast_to(
+            np.asarray(rain_probability, dtype=float), (r,)
+        ).reshape(r, 1, 1)
+
+        # Состояние и возраст огня упакованы в один uint8 на клетку
+        self.cells = fire_state.empty((r, grid_size, grid_size))
+        rows = np.arange(r)
+        self.cells[rows, start_fire_pos[:, 1], start_fire_pos[:, 0]] = (
+            fire_state.encode(fire_kernel.BURNING, 1)
+        )
+
+        # Агенты: координаты (x, y), лишние слоты реплик с меньшим числом
+        # агентов выключены маской
+        max_agents = int(num_agents.max(initial=0))
+        self.agent_mask = np.arange(max_agents) < num_agents[:, None]
+        self.agents = np.zeros((r, max_agents, 2), dtype=int)
+        if isinstance(rng, np.random.Generator):
+            self.agents[..., 0] = rng.integers(0, grid_size, (r, max_agents))
+            self.agents[..., 1] = rng.choice([0, grid_size - 1], (r, max_agents))
+        else:
+            # Свой поток у каждой реплики: число выборок зависит только от неё
+            for i, g in enumerate(rng):
+                self.agents[i, : num_agents[i], 0] = g.integers(
+                    0, grid_size, num_agents[i]
+                )
+                self.agents[i, : num_agents[i], 1] = g.choice(
+                    [0, grid_size - 1], num_agents[i]
+                )
+        self.agent_moves = np.zeros((r, max_agents), dtype=int)
+        self.extinguished_by_agent = np.zeros((r, max_agents), dtype=int)
+
+        self.counters = {name: np.zeros(r, dtype=int) for name in COUNTERS}
+        self.index = rows
+
+        self.results = {name: np.zeros(r, dtype=int) for name in COUNTERS}
+        self.results["num_agents"] = num_agents.copy()
+        self.results["agent_moves"] = np.zeros((r, max_agents), dtype=int)
+        self.results["extinguished_by_agent"] = np.zeros((r, max_agents), dtype=int)
+
+    @property
+    def grid(self):
+        return fire_state.state(self.cells)
+
+    @property
+    def fire_duration(self):
+        return fire_state.age(self.cells)
+
+    @property
+    def alive(self):
+        return len(self.index)
+
+    def step(self):
+        # Ветви fork() до первого шага делят одну сетку (копия при записи)
+        if not self.cells.flags.writeable:
+            self.cells = self.cells.copy()
+        self.counters["total_steps"] += 1
+        front = None
+        if self.kernel is None:
+            ignitions, front = fire_state.spread_fire_front(
+                self.cells,
+                self.probs,
+                self.rain_probability,
+                self.fire_life,
+                self.rng,
+            )
+        else:
+            ignitions = fire_convolve.spread_fire_packed(
+                self.cells,
+                self.kernel,
+                self.rain_probability,
+                self.fire_life,
+                self.rng,
+            )
+        self.counters["total_burned_cells"] += ignitions
+
+        if self.agent_mode == "sequential":
+            burning_left = move_agents(
+                self.cells,
+                self.agents,
+                self.agent_mask,
+                self.agent_moves,
+                self.extinguished_by_agent,
+                self.extinguish_area,
+                front,
+            )
+        else:
+            fire_policy.step_agents(
+                self.cells,
+                self.agents,
+                self.agent_mask,
+                self.agent_moves,
+                self.extinguished_by_agent,
+                self.extinguish_area,
+                self.agent_mode,
+            )
+            burning_left = np.count_nonzero(
+                fire_state.state(self.cells) == fire_kernel.BURNING, axis=(1, 2)
+            )
+        self.counters["extinguished_cells"] = self.extinguished_by_agent.sum(axis=1)
+        self.counters["total_steps_to_extinguish"] = self.agent_moves.sum(axis=1)
+
+        done = burning_left == 0
+        if done.any():
+            self._retire(done)
+
+    # Сохраняет результаты завершившихся реплик и убирает их из рабочих массивов
+    def _retire(self, done):
+        ids = self.index[done]
+        for name in COUNTERS:
+            self.results[name][ids] = self.counters[name][done]
+        self.results["agent_moves"][ids] = self.agent_moves[done]
+        self.results["extinguished_by_agent"][ids] = self.extinguished_by_agent[done]
+
+        keep = ~done
+        self.index = self.index[keep]
+        self.cells = self.cells[keep]
+        self.probs = self.probs[:, :, keep]
+        self.rain_probability = self.rain_probability[keep]
+        self.agents = self.agents[keep]
+        self.agent_mask = self.agent_mask[keep]
+        self.agent_moves = self.agent_moves[keep]
+        self.extinguished_by_agent = self.extinguished_by_agent[keep]
+        self.counters = {name: value[keep] for name, value in self.counters.items()}
+        if isinstance(self.rng, list):
+            self.rng = [g for g, k in zip(self.rng, keep) if k]
+
+    def run(self, max_steps=None):
+        steps = 0
+        while self.alive and (max_steps is None or steps < max_steps):
+            self.step()
+            steps += 1
+        return self.results
+
+    # Счётчики всех реплик: готовые из results, остальные - текущие
+    def current_results(self):
+        results = {name: value.copy() for name, value in self.results.items()}
+        for name in COUNTERS:
+            results[name][self.index] = self.counters[name]
+        results["agent_moves"][self.index] = self.agent_moves
+        results["extinguished_by_agent"][self.index] = self.extinguished_by_agent
+        return results
+
+    # До k шагов (None - пока есть огонь) одним вызовом. Возвращает
+    # current_results() или (current_results(), сводка по шагам) при
+    # summaries; сводка - (шаг, живые реплики, горящие клетки)
+    def advance(self, k=None, summaries=False):
+        if not summaries:
+            self.run(k)
+            return self.current_results()
+        rows = []
+        n = 0
+        while self.alive and (k is None or n < k):
+            self.step()
+            n += 1
+            rows.append(
+                (
+                    n,
+                    self.alive,
+                    int(np.count_nonzero(self.grid == fire_kernel.BURNING)),
+                )
+            )
+        return self.current_results(), np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+    # Ветвление живой симуляции (fire_simulation.Simulation) на branches
+    # продолжений "что если" без пересчёта общего начала. Ветви различаются
+    # числом агентов, ветром/скоростью огня (spread_prob, wind_direction и
+    # wind_strength задаются вместе) или дождём; None - как в симуляции.
+    # rng - список потоков по одному на ветвь или общий генератор.
+    # Агенты симуляции остаются на местах; если в ветви агентов меньше,
+    # лишние перестают ходить, если больше - новые ставятся как в __init__.
+    @classmethod
+    def fork(
+        cls,
+        simulation,
+        branches,
+        rng,
+        num_agents=None,
+        spread_prob=None,
+        wind_direction=None,
+        wind_strength=None,
+        rain_probability=None,
+        agent_mode=None,
+    ):
+        fire = simulation.fire
+        fire_state.check_fire_life(fire.fire_life)
+        if agent_mode is None:
+            agent_mode = simulation.agent_mode
+        grid_size = fire.grid.shape[0]
+        current = len(simulation.agents)
+        if num_agents is None:
+            num_agents = current
+        num_agents = np.broadcast_to(np.asarray(num_agents, dtype=int), (branches,))
+
+        if spread_prob is None:
+            probs = fire.probs[:, :, None]
+        else:
+            probs = fire_kernel.direction_probabilities(
+                np.broadcast_to(spread_prob, (branches,)),
+                np.broadcast_to(wind_direction, (branches,)),
+                np.broadcast_to(wind_strength, (branches,)),
+            )
+        if rain_probability is None:
+            rain_probability = fire.rain_probability
+
+        # Упакованная сетка симуляции: возраст огня берётся из фронта
+        alive = fire.grid[fire.front_y, fire.front_x] == fire_kernel.BURNING
+        age = np.zeros(fire.grid.shape, dtype=np.int64)
+        age[fire.front_y[alive], fire.front_x[alive]] = fire.front_age[alive]
+        cells = fire_state.encode(fire.grid, age)
+
+        slots = max(current, int(num_agents.max(initial=0)))
+        agents = np.zeros((branches, slots, 2), dtype=int)
+        agents[:, :current] = simulation.agents
+        for i in range(branches):
+            extra = max(0, num_agents[i] - current)
+            if extra:
+                g = rng[i] if isinstance(rng, list) else rng
+                agents[i, current : current + extra, 0] = g.integers(
+                    0, grid_size, extra
+                )
+                agents[i, current : current + extra, 1] = g.choice(
+                    [0, grid_size - 1], extra
+                )
+        agent_moves = np.zeros((branches, slots), dtype=int)
+        agent_moves[:, :current] = simulation.agent_moves
+        extinguished_by_agent = np.zeros((branches, slots), dtype=int)
+        extinguished_by_agent[:, :current] = simulation.extinguished_by_agent
+
+        counters = {
+            "total_burned_cells": np.full(branches, fire.total_burned_cells),
+            "extinguished_cells": extinguished_by_agent.sum(axis=1),
+            "total_steps_to_extinguish": agent_moves.sum(axis=1),
+            "total_steps": np.full(branches, simulation.total_steps),
+        }
+        results = {name: np.zeros(branches, dtype=int) for name in COUNTERS}
+        results["num_agents"] = num_agents.copy()
+        results["agent_moves"] = np.zeros((branches, slots), dtype=int)
+        results["extinguished_by_agent"] = np.zeros((branches, slots), dtype=int)
+
+        ensemble = cls.from_state(
+            {
+                "grid_size": grid_size,
+                "fire_life": fire.fire_life,
+                "extinguish_area": simulation.extinguish_area,
+                "rng": rng,
+                "kernel": None,
+                "agent_mode": agent_mode,
+                "size": branches,
+                "probs": np.broadcast_to(
+                    probs, probs.shape[:2] + (branches,) + probs.shape[3:]
+                ).copy(),
+                "rain_probability": np.broadcast_to(
+                    np.asarray(rain_probability, dtype=float), (branches,)
+                ).reshape(branches, 1, 1),
+                "cells": np.broadcast_to(cells, (branches,) + cells.shape),
+                "agent_mask": np.arange(slots) < num_agents[:, None],
+                "agents": agents,
+                "agent_moves": agent_moves,
+                "extinguished_by_agent": extinguished_by_agent,
+                "counters": counters,
+                "index": np.arange(branches),
+                "results": results,
+            }
+        )
+        if not fire.burning:
+            ensemble._retire(np.ones(branches, dtype=bool))
+        return ensemble
+
+    # Новый ансамбль из копий живых реплик: parts - [(ансамбль, номера в
+    # рабочих массивах)], номера могут повторяться. Копии продолжают расчёт с
+    # тем же огнём, агентами и счётчиками, но со своими потоками rng (список
+    # по одному на копию). Так размножаются траектории в fire_splitting.
+    @classmethod
+    def gather(cls, parts, rng):
+        parts = [(part, np.asarray(rows, dtype=int)) for part, rows in parts]
+        first = parts[0][0]
+        size = sum(len(rows) for _, rows in parts)
+        slots = max(part.agents.shape[1] for part, _ in parts)
+
+        def stack(name, fill=0):
+            values = [getattr(part, name)[rows] for part, rows in parts]
+            return np.concatenate(
+                [
+                    np.pad(
+                        v,
+                        ((0, 0), (0, slots - v.shape[1])) + ((0, 0),) * (v.ndim - 2),
+                        constant_values=fill,
+                    )
+                    for v in values
+                ]
+            )
+
+        num_agents = np.concatenate(
+            [part.results["num_agents"][part.index[rows]] for part, rows in parts]
+        )
+        results = {name: np.zeros(size, dtype=int) for name in COUNTERS}
+        results["num_agents"] = num_agents
+        results["agent_moves"] = np.zeros((size, slots), dtype=int)
+        results["extinguished_by_agent"] = np.zeros((size, slots), dtype=int)
+
+        return cls.from_state(
+            {
+                "grid_size": first.grid_size,
+                "fire_life": first.fire_life,
+                "extinguish_area": first.extinguish_area,
+                "rng": rng,
+                "kernel": first.kernel,
+                "agent_mode": first.agent_mode,
+                "size": size,
+                "probs": np.concatenate(
+                    [part.probs[:, :, rows] for part, rows in parts], axis=2
+                ),
+                "rain_probability": np.concatenate(
+                    [part.rain_probability[rows] for part, rows in parts]
+                ),
+                "cells": np.concatenate([part.cells[rows] for part, rows in parts]),
+                "agent_mask": stack("agent_mask", False),
+                "agents": stack("agents"),
+                "agent_moves": stack("agent_moves"),
+                "extinguished_by_agent": stack("extinguished_by_agent"),
+                "counters": {
+                    name: np.concatenate(
+                        [part.counters[name][rows] for part, rows in parts]
+                    )
+                    for name in first.counters
+                },
+                "index": np.arange(size),
+                "results": results,
+            }
+        )
+
+    # Полное состояние ансамбля для fire_checkpoint
+    def state_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_state(cls, state):
+        ensemble = cls.__new__(cls)
+        for name, value in state.items():
+            setattr(ensemble, name, value)
+        return ensemble
+
+
+# Ход всех агентов всех реплик. Агенты внутри реплики ходят по очереди, как в
+# старом move_agents(): цель - ближайшая горящая клетка (при равенстве - последняя
+# по строкам), тушение области EXTINGUISH_AREA вокруг позиции до хода. Работа идёт по списку горящих
+# клеток, а не по всей сетке; burning - этот список (плоские индексы по
+# возрастанию, как из fire_state.spread_fire_front()), None - найти по сетке.
+# Возвращает число оставшихся горящих клеток.
+def move_agents(
+    grid,
+    agents,
+    agent_mask,
+    agent_moves,
+    extinguished_by_agent,
+    extinguish_area,
+    burning=None,
+):
+    r_count, height, width = grid.shape
+    cells = height * width
+    half = extinguish_area // 2
+    offsets = np.arange(-half, half + 1)
+
+    flat_grid = grid.reshape(-1)
+    flat = burning
+    if flat is None:
+        flat = np.flatnonzero(
+            (flat_grid & fire_state.STATE_MASK) == fire_kernel.BURNING
+        )
+    r, cell = np.divmod(flat, cells)
+    y, x = np.divmod(cell, width)
+    # Ключ сортировки: сначала расстояние, затем более поздняя клетка по строкам
+    order = cells - 1 - cell
+    no_fire = np.iinfo(np.int64).max
+
+    for k in range(agents.shape[1]):
+        valid = np.flatnonzero(
+            agent_mask[:, k][r]
+            & ((flat_grid[flat] & fire_state.STATE_MASK) == fire_kernel.BURNING)
+        )
+        if len(valid) == 0:
+            continue
+        rv = r[valid]
+        ax = agents[:, k, 0].copy()
+        ay = agents[:, k, 1].copy()
+
+        dist = (x[valid] - ax[rv]) ** 2 + (y[valid] - ay[rv]) ** 2
+        best = np.full(r_count, no_fire, dtype=np.int64)
+        np.minimum.at(best, rv, dist * cells + order[valid])
+        acting = np.flatnonzero(best != no_fire)
+        ax = ax[acting]
+        ay = ay[acting]
+
+        target = cells - 1 - best[acting] % cells
+        agents[acting, k, 0] = np.clip(
+            ax + np.where(target % width > ax, 1, -1), 0, width - 1
+        )
+        agents[acting, k, 1] = np.clip(
+            ay + np.where(target // width > ay, 1, -1), 0, height - 1
+        )
+        agent_moves[acting, k] += 1
+
+        # Тушение окна EXTINGUISH_AREA x EXTINGUISH_AREA вокруг старой позиции
+        fy = ay[:, None, None] + offsets[None, :, None]
+        fx = ax[:, None, None] + offsets[None, None, :]
+        rows, fy, fx = np.broadcast_arrays(acting[:, None, None], fy, fx)
+        inside = (fy >= 0) & (fy < height) & (fx >= 0) & (fx < width)
+        hit = np.zeros(fy.shape, dtype=bool)
+        state = grid[rows[inside], fy[inside], fx[inside]] & fire_state.STATE_MASK
+        hit[inside] = state == fire_kernel.BURNING
+        grid[rows[hit], fy[hit], fx[hit]] = fire_kernel.BURNED
+        extinguished_by_agent[acting, k] += hit.sum(axis=(1, 2))
+
+    burning = (flat_grid[flat] & fire_state.STATE_MASK) == fire_kernel.BURNING
+    return np.bincount(r[burning], minlength=r_count)
+
+
+def _merge(results):
+    merged = {}
+    for name in results[0]:
+        values = [res[name] for res in results]
+        if values[0].ndim == 2:
+            width = max(v.shape[1] for v in values)
+            values = [np.pad(v, ((0, 0), (0, width - v.shape[1]))) for v in values]
+        merged[name] = np.concatenate(values)
+    return merged
+
+
+# Отпечаток серии run_ensemble(): скаляры, массивы параметров, ядро и
+# состояния потоков случайных чисел
+def _fingerprint(settings, params, kernel, generators):
+    digest = hashlib.sha256(repr(settings).encode())
+    for array in params + [np.asarray(kernel if kernel is not None else [])]:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.tobytes())
+    for g in generators:
+        digest.update(repr((getattr(g, "seed", None), g.bit_generator.state)).encode())
+    return digest.hexdigest()
+
+
+# Запуск большого ансамбля частями по batch_size реплик, чтобы массивы
+# случайных чисел помещались в память. С checkpoint_path каждые
+# checkpoint_every шагов текущий пакет и результаты готовых пакетов
+# сохраняются в файл; повторный вызов с тем же файлом продолжает серию с
+# последнего снимка. checkpoint_extra - данные вызывающего кода, которые
+# сохраняются в снимок (например, главное зерно). Снимок хранит отпечаток
+# серии (число реплик, batch_size, параметры, начальные состояния потоков);
+# снимок другой серии - ошибка, а не продолжение. После завершения серии
+# файл удаляется.
+def run_ensemble(
+    grid_size,
+    num_agents,
+    start_fire_pos,
+    spread_prob,
+    wind_direction,
+    wind_strength,
+    rain_probability,
+    fire_life,
+    extinguish_area,
+    rng,
+    batch_size=1024,
+    checkpoint_path=None,
+    checkpoint_every=100,
+    checkpoint_extra=None,
+    kernel=None,
+    agent_mode="sequential",
+):
+    # rng - общий генератор или список потоков по одному на реплику
+    start_fire_pos = np.asarray(start_fire_pos, dtype=int).reshape(-1, 2)
+    params = np.broadcast_arrays(
+        np.asarray(num_agents),
+        start_fire_pos[:, 0],
+        start_fire_pos[:, 1],
+        np.asarray(spread_prob),
+        np.asarray(wind_direction),
+        np.asarray(wind_strength),
+        np.asarray(rain_probability),
+    )
+    r = params[0].shape[0] if params[0].ndim else 1
+    params = [np.broadcast_to(p, (r,)) for p in params]
+    series = _fingerprint(
+        [r, batch_size, grid_size, fire_life, extinguish_area, agent_mode],
+        params,
+        kernel,
+        rng if isinstance(rng, list) else [rng],
+    )
+
+    results = []
+    first = 0
+    ensemble = None
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        ensemble, extra = fire_checkpoint.load(checkpoint_path)
+        if extra.get("series") != series:
+            raise ValueError(
+                f"checkpoint {checkpoint_path} belongs to a different series; "
+                "remove it to start this one"
+            )
+        first = extra["batch"]
+        if "done" in extra:
+            results.append(extra["done"])
+        if not isinstance(rng, list):
+            rng = ensemble.rng
+
+    for start in range(first, r, batch_size):
+        if ensemble is None:
+            part = [p[start : start + batch_size] for p in params]
+            ensemble = Ensemble(
+                grid_size,
+                part[0],
+                np.stack([part[1], part[2]], axis=-1),
+                part[3],
+                part[4],
+                part[5],
+                part[6],
+                fire_life,
+                extinguish_area,
+                rng[start : start + batch_size] if isinstance(rng, list) else rng,
+                kernel,
+                agent_mode,
+            )
+        if checkpoint_path is None:
+            ensemble.run()
+        while checkpoint_path is not None and ensemble.alive:
+            ensemble.run(checkpoint_every)
+            if ensemble.alive:
+                extra = dict(checkpoint_extra or {}, batch=start, series=series)
+                if results:
+                    extra["done"] = _merge(results)
+                fire_checkpoint.save(checkpoint_path, ensemble, **extra)
+        results.append(ensemble.results)
+        ensemble = None
+
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return _merge(results)
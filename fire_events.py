@@ -0,0 +1,173 @@
+import heapq
+
+import numpy as np
+
+import fire_kernel
+
+# Событийный движок: вместо перебора горящих клеток на каждом шаге для каждого
+# ребра источник-сосед сразу разыгрывается шаг поджога - геометрическое время
+# ожидания с вероятностью шага. События поджога и выгорания лежат в очереди с
+# приоритетом по времени и обрабатываются по порядку, пустые шаги
+# пропускаются. Работа пропорциональна числу поджогов, а не фронту * шагам.
+#
+# Семантика шагов та же, что у spread_fire(): клетка, загоревшаяся на шаге s
+# с возрастом a, поджигает соседей на шагах s + 1 ... s + FIRE_LIFE - a и
+# выгорает на шаге s + FIRE_LIFE - a + 1; поджоги считаются по парам. Дождь,
+# как и там, разыгрывается один раз на источник и шаг и действует на все
+# четыре ребра источника: по ряду дождливых шагов у каждого ребра отдельно
+# разыгрываются номер первого успешного сухого и первого успешного
+# дождливого шага. Там, где дождь всегда или никогда, ряд не нужен и работа
+# пропорциональна числу поджогов.
+# Агенты в этом движке не поддерживаются: он для долгих медленных пожаров.
+
+# Корзина шага: (цели поджогов, источники поджогов, выгорающие клетки)
+_IGNITION = 0
+_BURNOUT = 2
+
+
+class EventFire:
+    def __init__(self, height, width, probs, rain_probability, fire_life, rng):
+        self.grid = np.zeros((height, width), dtype=np.uint8)
+        self.ignition_time = np.full((height, width), -1, dtype=np.int64)
+        self.fire_life = fire_life
+        self.rng = rng
+        self.time = 0
+
+        shape = (height, width)
+        self._rain = np.broadcast_to(rain_probability, shape).reshape(-1)
+        # Вероятности рёбер (без дождя, при дожде) x направление x клетка
+        self._p_edge = np.minimum(
+            [
+                [
+                    np.broadcast_to(probs[k, d], shape).reshape(-1)
+                    for d in range(len(fire_kernel.DIRECTIONS))
+                ]
+                for k in range(2)
+            ],
+            1.0,
+        )
+        # Очередь с приоритетом по времени событий; события одного шага
+        # хранятся массивами в корзине этого шага
+        self._times = []
+        self._buckets = {}
+        self._dy = np.array([dy for dy, _ in fire_kernel.DIRECTIONS])[:, None]
+        self._dx = np.array([dx for _, dx in fire_kernel.DIRECTIONS])[:, None]
+
+        self.burning = 0  # Горящие клетки
+        self.burned = 0  # Выгоревшие клетки
+        self.total_burned_cells = 0  # Поджоги, как в spread_fire()
+
+    def ignite(self, x, y):
+        if self.grid[y, x] == fire_kernel.BURNING:
+            return
+        self.grid[y, x] = fire_kernel.BURNING
+        self.ignition_time[y, x] = self.time
+        self.burning += 1
+        self._schedule(np.array([y * self.grid.shape[1] + x]), 1)
+
+    def _push(self, time, kind, *arrays):
+        if time not in self._buckets:
+            self._buckets[time] = ([], [], [])
+            heapq.heappush(self._times, time)
+        bucket = self._buckets[time]
+        for i, values in enumerate(arrays):
+            bucket[kind + i].append(values)
+
+    # События для клеток cells, загоревшихся на текущем шаге с возрастом age
+    def _schedule(self, cells, age):
+        if len(cells) == 0:
+            return
+        height, width = self.grid.shape
+        active = self.fire_life - age
+        y, x = np.divmod(cells, width)
+        ty = y + self._dy
+        tx = x + self._dx
+        inside = (ty >= 0) & (ty < height) & (tx >= 0) & (tx < width)
+        rain = self._rain[cells]
+        if active <= 0:
+            wait = np.full(ty.shape, active + 1)
+        elif np.all((rain == 0) | (rain == 1)):
+            p = np.where(
+                rain == 1, self._p_edge[1][:, cells], self._p_edge[0][:, cells]
+            )
+            wait = self._first_success(p, inside, active)
+        else:
+            wait = self._wait_with_rain(cells, rain, inside, active)
+        hit = wait <= active
+
+        targets = ty[hit] * width + tx[hit]
+        sources = np.broadcast_to(cells, wait.shape)[hit]
+        waits = wait[hit]
+        order = np.argsort(waits, kind="stable")
+        waits, start = np.unique(waits[order], return_index=True)
+        for wait, part in zip(waits.tolist(), np.split(order, start[1:])):
+            self._push(self.time + wait, _IGNITION, targets[part], sources[part])
+        self._push(self.time + active + 1, _BURNOUT, cells)
+
+    # Номер первого успешного шага (направление x клетка) при вероятности p на
+    # каждом шаге; active + 1 - поджога нет
+    def _first_success(self, p, inside, active):
+        inside = inside & (p > 0)
+        wait = np.full(p.shape, active + 1)
+        wait[inside] = self.rng.geometric(p[inside])
+        return wait
+
+    # Шаги поджога с общим для рёбер источника дождём: ряд дождливых шагов
+    # (клетка x шаг) и для рёбер - номер первого успеха среди сухих и среди
+    # дождливых шагов, переведённый в номер шага по ряду
+    def _wait_with_rain(self, cells, rain, inside, active):
+        n = len(cells)
+        rained = self.rng.random((n, active)) < rain[:, None]
+        wait = np.full(inside.shape, active + 1)
+        # Строки сдвинуты на active + 1, чтобы счётчики всех клеток шли по
+        # возрастанию одним массивом для searchsorted
+        row = np.arange(n)
+        for k, kind in enumerate((~rained, rained)):
+            count = np.cumsum(kind, axis=1)
+            nth = self._first_success(self._p_edge[k][:, cells], inside, active)
+            found = nth <= count[:, -1]
+            position = (
+                np.searchsorted(
+                    (count + row[:, None] * (active + 1)).reshape(-1),
+                    nth + row * (active + 1),
+                )
+                - row * active
+            )
+            wait = np.where(found, np.minimum(wait, position + 1), wait)
+        return wait
+
+    # Один шаг: события с временем time + 1
+    def step(self):
+        self.time += 1
+        if self._times and self._times[0] == self.time:
+            heapq.heappop(self._times)
+        empty = [np.empty(0, dtype=np.int64)]
+        targets, sources, burnouts = (
+            np.concatenate(values + empty)
+            for values in self._buckets.pop(self.time, ([], [], []))
+        )
+        flat_grid = self.grid.reshape(-1)
+
+        # Все поджоги шага проверяются по сетке до шага
+        valid = (flat_grid[sources] == fire_kernel.BURNING) & (
+            flat_grid[targets] == fire_kernel.FUEL
+        )
+        self.total_burned_cells += int(np.count_nonzero(valid))
+        new = np.unique(targets[valid])
+        burnouts = burnouts[flat_grid[burnouts] == fire_kernel.BURNING]
+        flat_grid[burnouts] = fire_kernel.BURNED
+        flat_grid[new] = fire_kernel.BURNING
+        self.ignition_time.reshape(-1)[new] = self.time
+        self.burning += len(new) - len(burnouts)
+        self.burned += len(burnouts)
+        self._schedule(new, 0)
+
+    # До конца пожара (или до шага max_time), пропуская шаги без событий
+    def run(self, max_time=None):
+        while self._times and (max_time is None or self.time < max_time):
+            next_time = self._times[0]
+            if max_time is not None and next_time > max_time:
+                self.time = max_time
+                break
+            self.time = next_time - 1
+            self.step()
@@ -0,0 +1,127 @@
+import numpy as np
+
+import fire_rng
+
+# Состояния клеток
+FUEL = 0  # Негорящая область
+BURNING = 1  # Огонь
+BURNED = 3  # Сгоревшая или потушенная область
+
+# Соседи клетки (dy, dx) в том же порядке, что и в старом цикле spread_fire()
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+# Направление ветра -> индекс соседа по ветру в DIRECTIONS
+WIND_DIRECTIONS = {"N": 1, "S": 0, "E": 2, "W": 3}
+
+
+# Вероятности распространения по направлениям: probs[0] без дождя, probs[1] при
+# дожде (базовая вероятность уменьшается вдвое, ветер добавляется после).
+# Скаляры дают форму (2, 4, 1, 1); векторы длины R дают (2, 4, R, 1, 1) для
+# ансамбля сеток (R, H, W).
+def direction_probabilities(spread_prob, wind_direction, wind_strength):
+    spread_prob = np.asarray(spread_prob, dtype=float)
+    wind_strength = np.asarray(wind_strength, dtype=float)
+    wind_index = np.vectorize(WIND_DIRECTIONS.__getitem__, otypes=[int])(wind_direction)
+    shape = np.broadcast_shapes(
+        spread_prob.shape, wind_strength.shape, wind_index.shape
+    )
+
+    bonus = np.zeros((len(DIRECTIONS),) + shape)
+    for d in range(len(DIRECTIONS)):
+        bonus[d] = np.where(wind_index == d, wind_strength, 0.0)
+
+    probs = np.stack([spread_prob + bonus, spread_prob * 0.5 + bonus])
+    return probs.reshape(probs.shape + (1, 1))
+
+
+# Сдвиг маски по двум последним осям: out[y + dy, x + dx] = mask[y, x]
+def shift(mask, dy, dx):
+    out = np.zeros_like(mask)
+    h, w = mask.shape[-2:]
+    out[..., max(dy, 0) : h + min(dy, 0), max(dx, 0) : w + min(dx, 0)] = mask[
+        ..., max(-dy, 0) : h + min(-dy, 0), max(-dx, 0) : w + min(-dx, 0)
+    ]
+    return out
+
+
+# Один шаг распространения огня по всей сетке (или по ансамблю сеток с
+# ведущими осями). fire_duration обновляется на месте, как и раньше.
+# Возвращает новую сетку и число поджогов (по сетке ансамбля).
+def spread_fire(grid, fire_duration, probs, rain_probability, fire_life, rng):
+    burning = grid == BURNING
+    fire_duration[burning] += 1
+    burned_out = burning & (fire_duration > fire_life)
+    active = burning & ~burned_out
+    fuel = grid == FUEL
+
+    new_grid = grid.copy()
+    new_grid[burned_out] = BURNED
+    targets, ignitions = ignition_targets(active, fuel, probs, rain_probability, rng)
+    new_grid[targets] = BURNING
+
+    return new_grid, ignitions
+
+
+# Клетки, которые загорятся от горящих клеток active на этом шаге, и число
+# поджогов (каждая успешная пара источник-сосед считается отдельно)
+def ignition_targets(active, fuel, probs, rain_probability, rng):
+    targets = np.zeros(active.shape, dtype=bool)
+    hit, ignitions = ignite_from(
+        np.flatnonzero(active),
+        active.shape,
+        fuel.reshape(-1).__getitem__,
+        probs,
+        rain_probability,
+        rng,
+    )
+    targets.reshape(-1)[hit] = True
+    return targets, ignitions
+
+
+# То же по горящим клеткам sources (плоские индексы по возрастанию) сетки
+# формы shape: проверяются только соседи источников, без проходов по всей
+# сетке. fuel(индексы) - маска топлива для плоских индексов клеток.
+# Возвращает (плоские индексы подожжённых клеток, возможно с повторами, число
+# поджогов).
+def ignite_from(sources, shape, fuel, probs, rain_probability, rng):
+    lead = shape[:-2]
+    height, width = shape[-2:]
+    owners, cell = np.divmod(sources, height * width)
+    ys, xs = np.divmod(cell, width)
+    # Одна выборка случайных чисел на шаг: дождь + 4 направления, только для
+    # горящих клеток. rng - генератор или список генераторов по репликам.
+    draws = fire_rng.draw(rng, owners, len(DIRECTIONS) + 1, ys, xs, width)
+    rain = draws[0] < _values_at(rain_probability, shape, owners, sources)
+
+    targets = []
+    hit_owners = []
+    for d, (dy, dx) in enumerate(DIRECTIONS):
+        p = np.where(
+            rain,
+            _values_at(probs[1, d], shape, owners, sources),
+            _values_at(probs[0, d], shape, owners, sources),
+        )
+        ty = ys + dy
+        tx = xs + dx
+        spread = np.flatnonzero(
+            (draws[d + 1] < p) & (ty >= 0) & (ty < height) & (tx >= 0) & (tx < width)
+        )
+        target = sources[spread] + (dy * width + dx)
+        hit = fuel(target)
+        targets.append(target[hit])
+        hit_owners.append(owners[spread[hit]])
+
+    ignitions = np.bincount(np.concatenate(hit_owners), minlength=int(np.prod(lead)))
+    if not lead:
+        return np.concatenate(targets), int(ignitions[0])
+    return np.concatenate(targets), ignitions.reshape(lead)
+
+
+# Значения массива values, растянутого до формы shape, в клетках с плоскими
+# индексами index; owners - номера сеток клеток (index // (H * W)). Значения,
+# общие для всей сетки (скаляр или по реплике), берутся без растяжения.
+def _values_at(values, shape, owners, index):
+    values = np.broadcast_to(values, shape)
+    if values.strides[-2:] == (0, 0):
+        return values[..., 0, 0].reshape(-1)[owners]
+    return values[np.unravel_index(index, shape)]
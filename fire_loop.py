@@ -0,0 +1,83 @@
+import time
+
+# Цикл окна с раздельными темпами симуляции и отрисовки. За один кадр
+# StepScheduler.run() делает столько шагов, сколько положено по своему темпу
+# (steps_per_second; None - сколько успеет до конца кадра), затем окно рисует
+# последнее состояние один раз. Если шаги не укладываются в кадр, отстающие
+# шаги отбрасываются, а не копятся, и кадр рисуется, как только шаги
+# закончились: пропущенные кадры не накапливаются. Не зависит от pygame.
+
+
+# Темп за последнее окно window секунд (события в секунду)
+class RateMeter:
+    def __init__(self, window=1.0):
+        self.window = window
+        self.rate = 0.0
+        self._count = 0
+        self._start = time.perf_counter()
+
+    def add(self, count=1):
+        self._count += count
+        now = time.perf_counter()
+        if now - self._start >= self.window:
+            self.rate = self._count / (now - self._start)
+            self._count = 0
+            self._start = now
+
+
+class StepScheduler:
+    def __init__(self, steps_per_second=None, frame_rate=30):
+        self.steps_per_second = steps_per_second
+        self.frame_rate = frame_rate
+        self.steps = RateMeter()
+        self.frames = RateMeter()
+        self._debt = 0.0
+        self._last = time.perf_counter()
+        self._frame_start = self._last
+
+    # Шаги этого кадра: step() вызывается, пока она возвращает не False, не
+    # исчерпан темп и не кончилось время кадра. limit - не больше limit шагов
+    # без учёта темпа (перемотка до нужного шага). Возвращает число шагов.
+    def run(self, step, limit=None):
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        deadline = self._frame_start + 1.0 / self.frame_rate
+
+        if limit is not None or self.steps_per_second is None:
+            due = limit
+        else:
+            self._debt += elapsed * self.steps_per_second
+            due = int(self._debt)
+            self._debt -= due
+
+        done = 0
+        while due is None or done < due:
+            if step() is False:
+                break
+            done += 1
+            if time.perf_counter() >= deadline:
+                break
+        if self.steps_per_second is not None and limit is None and done < due:
+            # Не успели: отставание не переносится на следующие кадры
+            self._debt = 0.0
+        self.steps.add(done)
+        return done
+
+    # Конец кадра: ожидание до следующего кадра, если время осталось
+    def frame_done(self):
+        self.frames.add()
+        now = time.perf_counter()
+        wait = self._frame_start + 1.0 / self.frame_rate - now
+        if wait > 0:
+            time.sleep(wait)
+        self._frame_start = time.perf_counter()
+
+    # Пауза: время без шагов не превращается в долг шагов
+    def pause(self):
+        self._last = time.perf_counter()
+        self._debt = 0.0
+
+    # Строка для окна: шаги в секунду и кадры в секунду
+    def status(self):
+        return f"{self.steps.rate:.0f} steps/s, {self.frames.rate:.0f} FPS"
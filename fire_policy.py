@@ -0,0 +1,224 @@
+import numpy as np
+
+import fire_agents
+import fire_kernel
+import fire_state
+
+# Политики агентов: функция policy(summary, agents, agent_mask) получает сводку
+# огня (FireSummary) и всех агентов всех реплик сразу - массив (R, N, 2)
+# координат (x, y) и маску (R, N) - и возвращает цели (R, N, 2), -1 у агентов
+# без цели. step_agents() делает по целям один одновременный ход, как
+# fire_agents.move_agents_simultaneous(): шаг к цели, тушение окна вокруг
+# позиции до хода, клетку под несколькими окнами получает меньший номер.
+# Цикла по агентам нет ни в политиках, ни в ходе, поэтому политики работают
+# и в ансамбле (Ensemble), и в одиночной симуляции (R = 1).
+
+# Сторона квадратного района для сводки интенсивности
+REGION_SIZE = 10
+
+
+# Сводка огня для политик. grid - сетка состояний (R, H, W) (упакованная
+# fire_state тоже подходит). Фронт - горящие клетки (реплика, y, x) по
+# строкам, intensity - число горящих клеток в каждом районе (R, районы).
+class FireSummary:
+    def __init__(self, grid, region_size=REGION_SIZE):
+        self.burning = (grid & fire_state.STATE_MASK) == fire_kernel.BURNING
+        self.size, self.height, self.width = grid.shape
+        self.front = np.nonzero(self.burning)
+        self.region_size = region_size
+        self.region_cols = -(-self.width // region_size)
+        self.regions = -(-self.height // region_size) * self.region_cols
+        self.front_region = self.region_of(self.front[1], self.front[2])
+        self.intensity = np.bincount(
+            self.front[0] * self.regions + self.front_region,
+            minlength=self.size * self.regions,
+        ).reshape(self.size, self.regions)
+
+    def region_of(self, ys, xs):
+        return (ys // self.region_size) * self.region_cols + xs // self.region_size
+
+    # Поле расстояний в точках агентов: (квадрат расстояния, номер клетки)
+    # ближайшего огня своей реплики, -1 без огня
+    def nearest(self, agents):
+        return fire_agents.nearest_fire(self.burning, agents[..., 1], agents[..., 0])
+
+
+# Номер клетки -> цели (x, y), -1 сохраняется
+def _targets(index, width):
+    return np.where(
+        index[..., None] >= 0, np.stack([index % width, index // width], -1), -1
+    )
+
+
+# Каждый агент идёт к ближайшему огню своей реплики
+def greedy_nearest(summary, agents, agent_mask):
+    _, index = summary.nearest(agents)
+    return _targets(np.where(agent_mask, index, -1), summary.width)
+
+
+# Агенты делятся между горящими районами пропорционально интенсивности:
+# район получает не больше ceil(N * интенсивность / горящие клетки) агентов.
+# Агент остаётся в районе своего ближайшего огня, если там есть место (место
+# получают ближайшие к огню); лишние переходят в районы со свободными местами
+# по убыванию интенсивности. Цель - ближайший огонь своего района.
+def region_partitioned(summary, agents, agent_mask):
+    r, n = agent_mask.shape
+    regions = summary.regions
+    dist2, index = summary.nearest(agents)
+    acting = agent_mask & (index >= 0)
+    replica, slot = np.nonzero(acting)
+    index = index[acting]
+    home = replica * regions + summary.region_of(
+        index // summary.width, index % summary.width
+    )
+
+    total = summary.intensity.sum(axis=1, keepdims=True)
+    crew = np.count_nonzero(acting, axis=1)[:, None]
+    capacity = (-(-crew * summary.intensity // np.maximum(total, 1))).reshape(-1)
+
+    # Место в районе по близости к огню
+    order = np.lexsort((slot, dist2[acting], home))
+    group_start = np.searchsorted(home[order], home[order])
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - group_start
+    stay = rank < capacity[home]
+
+    # Свободные места: районы реплики по убыванию интенсивности
+    kept = np.bincount(home[stay], minlength=r * regions)
+    spare = capacity - kept
+    by_intensity = np.argsort(-summary.intensity, axis=1, kind="stable")
+    spare_key = (np.arange(r)[:, None] * regions + by_intensity).reshape(-1)
+    seats = np.repeat(spare_key, spare[spare_key])
+    first_seat = np.cumsum(spare.reshape(r, regions).sum(axis=1)) - spare.reshape(
+        r, regions
+    ).sum(axis=1)
+    moved = np.flatnonzero(~stay)
+    moved_rank = np.arange(len(moved)) - np.searchsorted(replica[moved], replica[moved])
+    key = home.copy()
+    key[moved] = seats[first_seat[replica[moved]] + moved_rank]
+
+    targets = np.full((r, n), -1, dtype=np.int64)
+    targets[acting] = _nearest_in_region(summary, key, agents[acting])
+    return _targets(targets, summary.width)
+
+
+# Ближайшая горящая клетка района key (реплика * районы + район) для каждого
+# агента: пары агент-клетка только внутри района, без матрицы всех пар
+def _nearest_in_region(summary, key, agents):
+    front_key = summary.front[0] * summary.regions + summary.front_region
+    order = np.argsort(front_key, kind="stable")
+    sorted_key = front_key[order]
+    start = np.searchsorted(sorted_key, key)
+    count = np.searchsorted(sorted_key, key, side="right") - start
+
+    owner = np.repeat(np.arange(len(key)), count)
+    first = np.cumsum(count) - count
+    pick = order[start[owner] + np.arange(len(owner)) - first[owner]]
+    fy = summary.front[1][pick]
+    fx = summary.front[2][pick]
+    cells = summary.height * summary.width
+    cell = fy * summary.width + fx
+    dist = (fx - agents[owner, 0]) ** 2 + (fy - agents[owner, 1]) ** 2
+    best = np.full(len(key), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(best, owner, dist * cells + (cells - 1 - cell))
+    return cells - 1 - best % cells
+
+
+# Назначение агентов горящим районам с минимальной суммой расстояний
+# (венгерский алгоритм, scipy.optimize.linear_sum_assignment). Стоимость
+# пары - расстояние до ближайшего огня района. Если агентов больше, чем
+# горящих районов, район может получить несколько агентов, но не больше
+# ceil(N / районы). Задача решается отдельно для каждой реплики.
+def min_cost_assignment(summary, agents, agent_mask):
+    from scipy.optimize import linear_sum_assignment
+
+    r, n = agent_mask.shape
+    cells = summary.height * summary.width
+    index = np.full((r, n), -1, dtype=np.int64)
+    replica, fy, fx = summary.front
+    bounds = np.searchsorted(replica, np.arange(r + 1))
+    for i in range(r):
+        slots = np.flatnonzero(agent_mask[i])
+        part = slice(bounds[i], bounds[i + 1])
+        if len(slots) == 0 or part.start == part.stop:
+            continue
+        y, x = fy[part], fx[part]
+        region = summary.front_region[part]
+        burning_regions, group = np.unique(region, return_inverse=True)
+        ax = agents[i, slots, 0]
+        ay = agents[i, slots, 1]
+
+        # Ближайшая клетка каждого района для каждого агента
+        cell = y * summary.width + x
+        key = ((x - ax[:, None]) ** 2 + (y - ay[:, None]) ** 2) * cells + (
+            cells - 1 - cell
+        )
+        best = np.full((len(slots), len(burning_regions)), np.iinfo(np.int64).max)
+        np.minimum.at(best, (slice(None), group), key)
+        target = cells - 1 - best % cells
+        cost = np.sqrt(best // cells)
+
+        copies = -(-len(slots) // len(burning_regions))
+        agent, column = linear_sum_assignment(np.tile(cost, copies))
+        index[i, slots[agent]] = target[agent, column % len(burning_regions)]
+    return _targets(index, summary.width)
+
+
+# Политики по имени для agent_mode
+POLICIES = {
+    # То же, что fire_agents.move_agents_simultaneous()
+    "simultaneous": greedy_nearest,
+    "greedy": greedy_nearest,
+    "regions": region_partitioned,
+    "assignment": min_cost_assignment,
+}
+
+
+# Один ход агентов всех реплик по политике policy (имя из POLICIES или
+# функция). grid (R, H, W) меняется на месте. Возвращает (цели (R, N, 2),
+# потушенные клетки как номера в grid.reshape(-1)).
+def step_agents(
+    grid,
+    agents,
+    agent_mask,
+    agent_moves,
+    extinguished_by_agent,
+    extinguish_area,
+    policy,
+):
+    policy = POLICIES.get(policy, policy)
+    summary = FireSummary(grid)
+    targets = policy(summary, agents, agent_mask)
+    acting = agent_mask & (targets[..., 0] >= 0)
+    if not acting.any():
+        return targets, np.empty(0, dtype=np.int64)
+
+    height, width = summary.height, summary.width
+    replica, slot = np.nonzero(acting)
+    x = agents[replica, slot, 0]
+    y = agents[replica, slot, 1]
+    tx = targets[replica, slot, 0]
+    ty = targets[replica, slot, 1]
+    agents[replica, slot, 0] = np.clip(x + np.where(tx > x, 1, -1), 0, width - 1)
+    agents[replica, slot, 1] = np.clip(y + np.where(ty > y, 1, -1), 0, height - 1)
+    agent_moves[replica, slot] += 1
+
+    # Реплики стоят друг под другом с зазором в половину окна, поэтому окна
+    # не переходят в соседнюю реплику; агенты идут по репликам, затем по
+    # номеру, и меньший номер внутри реплики остаётся владельцем клетки
+    gap = extinguish_area // 2
+    stride = height + gap
+    stacked, owner = fire_agents.footprint_owners(
+        summary.size * stride, width, y + replica * stride, x, extinguish_area
+    )
+    row, column = np.divmod(stacked, width)
+    r, row = np.divmod(row, stride)
+    inside = row < height
+    cells = (r[inside] * height + row[inside]) * width + column[inside]
+    owner = owner[inside]
+    flat_grid = grid.reshape(-1)
+    hit = (flat_grid[cells] & fire_state.STATE_MASK) == fire_kernel.BURNING
+    cells = cells[hit]
+    flat_grid[cells] = fire_kernel.BURNED
+    np.add.at(extinguished_by_agent, (replica[owner[hit]], slot[owner[hit]]), 1)
+    return targets, cells
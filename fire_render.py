@@ -0,0 +1,265 @@
+import numpy as np
+import pygame
+
+import fire_kernel
+
+# Отрисовка сетки одной операцией вместо GRID_SIZE^2 вызовов pygame.draw.rect:
+# значения клеток переводятся в цвета таблицей палитры, картинка размером с
+# сетку (клетка = пиксель) масштабируется до CELL_SIZE, агенты рисуются одним
+# вызовом Surface.blits() готовым спрайтом.
+
+GREEN = (0, 255, 0)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+BLACK = (0, 0, 0)
+
+# Палитра: значение клетки (uint8) -> RGB, общая для всех окон. Значения без
+# своего цвета - синие, как раньше в draw_grid().
+PALETTE = np.full((256, 3), BLUE, dtype=np.uint8)
+PALETTE[fire_kernel.FUEL] = GREEN
+PALETTE[fire_kernel.BURNING] = RED
+PALETTE[fire_kernel.BURNED] = BLACK
+
+AGENT_COLOR = BLUE
+
+# Сторона квадратного участка (в клетках), которым перерисовывается экран в
+# draw_dirty()
+TILE_SIZE = 16
+
+
+# Цвета клеток сетки (H, W) в формате surfarray: (W, H, 3)
+def colors(grid, palette=PALETTE):
+    return palette[np.asarray(grid).astype(np.uint8, copy=False).T]
+
+
+class GridRenderer:
+    def __init__(self, shape, cell_size, palette=PALETTE, agent_color=AGENT_COLOR):
+        height, width = shape
+        self.cell_size = cell_size
+        self.palette = palette
+        self._cells = pygame.Surface((width, height))
+        self._scaled = pygame.Surface((width * cell_size, height * cell_size))
+        self._agent = pygame.Surface((cell_size, cell_size), pygame.SRCALPHA)
+        if cell_size < 3:
+            # Слишком мелко для круга: агент - закрашенная клетка
+            self._agent.fill(agent_color)
+        else:
+            pygame.draw.circle(
+                self._agent,
+                agent_color,
+                (cell_size // 2, cell_size // 2),
+                cell_size // 2,
+            )
+        # Что нарисовано на экране последним вызовом draw_dirty()
+        self._grid = None
+        self._agents = None
+        self._offset = None
+
+    # Следующий draw_dirty() перерисует всё (например, после screen.fill)
+    def invalidate(self):
+        self._grid = None
+
+    # Сетка grid и агенты (x, y) на screen со сдвигом offset
+    def draw(self, screen, grid, agents=(), offset=(0, 0)):
+        pygame.surfarray.blit_array(self._cells, colors(grid, self.palette))
+        pygame.transform.scale(self._cells, self._scaled.get_size(), self._scaled)
+        screen.blit(self._scaled, offset)
+        if len(agents):
+            ox, oy = offset
+            cs = self.cell_size
+            screen.blits(
+                [(self._agent, (x * cs + ox, y * cs + oy)) for x, y in agents],
+                doreturn=False,
+            )
+
+    # Перерисовка только изменившихся участков: сетка сравнивается с
+    # нарисованной в прошлый раз, к изменившимся клеткам добавляются клетки
+    # под старыми и новыми позициями сдвинувшихся агентов. Участки
+    # TILE_SIZE x TILE_SIZE с изменениями перерисовываются вместе с агентами
+    # на них. Возвращает прямоугольники экрана для pygame.display.update().
+    def draw_dirty(self, screen, grid, agents=(), offset=(0, 0)):
+        grid = np.asarray(grid)
+        agents = np.asarray(agents, dtype=int).reshape(-1, 2)
+        height, width = grid.shape
+        cs = self.cell_size
+        ox, oy = offset
+        if (
+            self._grid is None
+            or self._grid.shape != grid.shape
+            or self._offset != tuple(offset)
+        ):
+            self.draw(screen, grid, agents, offset)
+            self._remember(grid, agents, offset)
+            return [pygame.Rect(ox, oy, width * cs, height * cs)]
+
+        changed = grid != self._grid
+        moved = slice(None)
+        if len(agents) == len(self._agents):
+            moved = (agents != self._agents).any(axis=1)
+        for positions in (self._agents[moved], agents[moved]):
+            changed[positions[:, 1], positions[:, 0]] = True
+        ys, xs = np.nonzero(changed)
+        if len(ys) == 0:
+            return []
+        tiles = np.unique((ys // TILE_SIZE) * width + xs // TILE_SIZE)
+
+        pygame.surfarray.blit_array(self._cells, colors(grid, self.palette))
+        rects = []
+        for ty, tx in zip(*(t.tolist() for t in np.divmod(tiles, width))):
+            x0 = tx * TILE_SIZE
+            y0 = ty * TILE_SIZE
+            area = pygame.Rect(
+                x0, y0, min(TILE_SIZE, width - x0), min(TILE_SIZE, height - y0)
+            )
+            rect = pygame.Rect(ox + x0 * cs, oy + y0 * cs, area.w * cs, area.h * cs)
+            screen.blit(
+                pygame.transform.scale(self._cells.subsurface(area), rect.size), rect
+            )
+            rects.append(rect)
+
+        tile_y = agents[:, 1] // TILE_SIZE
+        tile_x = agents[:, 0] // TILE_SIZE
+        redraw = np.isin(tile_y * width + tile_x, tiles)
+        if redraw.any():
+            screen.blits(
+                [
+                    (self._agent, (x * cs + ox, y * cs + oy))
+                    for x, y in agents[redraw].tolist()
+                ],
+                doreturn=False,
+            )
+        self._remember(grid, agents, offset)
+        return rects
+
+    def _remember(self, grid, agents, offset):
+        self._grid = grid.copy()
+        self._agents = agents.copy()
+        self._offset = tuple(offset)
+
+
+# Окно просмотра сетки размером size = (ширина, высота) пикселей с масштабом и
+# сдвигом. При приближении клетка занимает cell_size пикселей и рисуется
+# только видимая часть сетки; при отдалении пиксель показывает блок pool x
+# pool клеток (горящая клетка в блоке важнее всего, иначе - максимум
+# значения, сгоревшая важнее несгоревшей), поэтому мелкие очаги видны на любом
+# масштабе. Видимая часть рисуется через GridRenderer.draw_dirty().
+class Viewport:
+    def __init__(self, shape, size, cell_size, offset=(0, 0), palette=PALETTE):
+        self.shape = shape
+        self.size = size
+        self.offset = offset
+        self.palette = palette
+        self.cell_size = cell_size
+        self.pool = 1
+        self.x0 = 0
+        self.y0 = 0
+        self._renderer = None
+        self._renderer_key = None
+
+    # Размер видимой части в пикселях-клетках окна: (строки, столбцы)
+    def extent(self):
+        height, width = self.shape
+        return (
+            min(self.size[1] // self.cell_size, -(-height // self.pool)),
+            min(self.size[0] // self.cell_size, -(-width // self.pool)),
+        )
+
+    def _clamp(self):
+        rows, cols = self.extent()
+        self.y0 = int(np.clip(self.y0, 0, max(0, self.shape[0] - rows * self.pool)))
+        self.x0 = int(np.clip(self.x0, 0, max(0, self.shape[1] - cols * self.pool)))
+
+    # Клетка сетки (x, y) под точкой экрана pos или None
+    def to_cell(self, pos):
+        px = pos[0] - self.offset[0]
+        py = pos[1] - self.offset[1]
+        rows, cols = self.extent()
+        if not (0 <= px < cols * self.cell_size and 0 <= py < rows * self.cell_size):
+            return None
+        x = self.x0 + px // self.cell_size * self.pool
+        y = self.y0 + py // self.cell_size * self.pool
+        if x >= self.shape[1] or y >= self.shape[0]:
+            return None
+        return x, y
+
+    # Масштаб в 2 раза ближе (steps > 0) или дальше (steps < 0); клетка под
+    # pos остаётся на месте
+    def zoom(self, steps, pos=None):
+        if pos is None:
+            pos = (
+                self.offset[0] + self.size[0] // 2,
+                self.offset[1] + self.size[1] // 2,
+            )
+        anchor = self.to_cell(pos)
+        for _ in range(abs(steps)):
+            if steps > 0:
+                if self.pool > 1:
+                    self.pool //= 2
+                elif self.cell_size < min(self.size):
+                    self.cell_size *= 2
+            elif self.cell_size > 1:
+                self.cell_size //= 2
+            elif self.pool < max(self.shape):
+                self.pool *= 2
+        if anchor is not None:
+            self.x0 = (
+                anchor[0] - (pos[0] - self.offset[0]) // self.cell_size * self.pool
+            )
+            self.y0 = (
+                anchor[1] - (pos[1] - self.offset[1]) // self.cell_size * self.pool
+            )
+        self._clamp()
+
+    # Масштаб, при котором видна вся сетка
+    def fit(self):
+        while True:
+            rows, cols = self.extent()
+            if rows * self.pool >= self.shape[0] and cols * self.pool >= self.shape[1]:
+                break
+            self.zoom(-1)
+        self.x0 = self.y0 = 0
+
+    # Сдвиг на (dx, dy) пикселей-клеток окна
+    def pan(self, dx, dy):
+        self.x0 += dx * self.pool
+        self.y0 += dy * self.pool
+        self._clamp()
+
+    # Видимая часть сетки, при отдалении - сжатая блоками pool x pool
+    def window(self, grid):
+        rows, cols = self.extent()
+        p = self.pool
+        part = grid[self.y0 : self.y0 + rows * p, self.x0 : self.x0 + cols * p]
+        if p == 1:
+            return part
+        part = np.pad(
+            part, ((0, rows * p - part.shape[0]), (0, cols * p - part.shape[1]))
+        )
+        blocks = part.reshape(rows, p, cols, p)
+        burning = (blocks == fire_kernel.BURNING).any(axis=(1, 3))
+        return np.where(burning, fire_kernel.BURNING, blocks.max(axis=(1, 3)))
+
+    # Следующий draw() перерисует всё окно
+    def invalidate(self):
+        if self._renderer is not None:
+            self._renderer.invalidate()
+
+    # Видимая часть и агенты в ней; возвращает прямоугольники для
+    # pygame.display.update()
+    def draw(self, screen, grid, agents=()):
+        view = self.window(grid)
+        if self._renderer is None or self._renderer_key != (view.shape, self.cell_size):
+            self._renderer = GridRenderer(view.shape, self.cell_size, self.palette)
+            self._renderer_key = (view.shape, self.cell_size)
+        agents = np.asarray(agents, dtype=int).reshape(-1, 2)
+        vx = (agents[:, 0] - self.x0) // self.pool
+        vy = (agents[:, 1] - self.y0) // self.pool
+        visible = (
+            (agents[:, 0] >= self.x0)
+            & (agents[:, 1] >= self.y0)
+            & (vx < view.shape[1])
+            & (vy < view.shape[0])
+        )
+        return self._renderer.draw_dirty(
+            screen, view, np.stack([vx, vy], -1)[visible], self.offset
+        )
@@ -0,0 +1,98 @@
+import numpy as np
+
+# Потоки случайных чисел, которые зависят только от главного зерна и номера
+# запуска, а не от того, в каком процессе, потоке или слоте ансамбля запуск
+# оказался. Любой запуск из большой серии можно повторить отдельно.
+
+
+# Поток Philox для ключа (master_seed, *key), например (seed, run) или
+# (seed, run, config)
+def stream(master_seed, *key):
+    seed_seq = np.random.SeedSequence(master_seed, spawn_key=key)
+    return np.random.Generator(np.random.Philox(seed_seq))
+
+
+def streams(master_seed, keys):
+    return [
+        stream(master_seed, *(key if isinstance(key, tuple) else (key,)))
+        for key in keys
+    ]
+
+
+# Случайное главное зерно, которое можно сохранить вместе с результатами
+def new_master_seed():
+    return int(np.random.SeedSequence().generate_state(1, np.uint32)[0])
+
+
+# Общие случайные числа для сравнения конфигураций (например, числа
+# агентов) на одном и том же пожаре. Числа распространения огня берутся из
+# cell_uniform() по (зерно, номер выборки, клетка), а не по очереди из
+# потока, поэтому клетка, которая горит на одном шаге в двух конфигурациях,
+# получает в обеих одни и те же числа, как бы ни отличались остальные
+# клетки. Остальные выборки (места агентов) идут из отдельного потока-потомка
+# ключа: stream(master_seed, *key) занят точкой возгорания запуска, и агенты
+# не должны повторять её числа.
+class CommonStream:
+    def __init__(self, master_seed, *key):
+        cells, agents = np.random.SeedSequence(master_seed, spawn_key=key).spawn(2)
+        self.generator = np.random.Generator(np.random.Philox(agents))
+        self.seed = int(cells.generate_state(1, np.uint64)[0])
+        self.draws = 0
+
+    def __getattr__(self, name):
+        return getattr(self.generator, name)
+
+    # Выборка (channels, n) для клеток (ys, xs) сетки шириной width;
+    # каждая выборка (обычно одна на шаг) получает свой номер
+    def cell_random(self, ys, xs, width, channels):
+        draws = cell_uniform(self.seed, self.draws, ys, xs, width, channels)
+        self.draws += 1
+        return draws
+
+
+def common_streams(master_seed, keys):
+    return [
+        CommonStream(master_seed, *(key if isinstance(key, tuple) else (key,)))
+        for key in keys
+    ]
+
+
+# Выборка (channels, n) для n клеток. Если rng - список генераторов по одному
+# на реплику ансамбля, каждая реплика берёт числа из своего потока; owners -
+# номера реплик клеток, отсортированные по возрастанию (как у np.nonzero).
+# CommonStream берёт числа по клеткам (ys, xs) сетки шириной width.
+def draw(rng, owners, channels, ys=None, xs=None, width=None):
+    if isinstance(rng, np.random.Generator):
+        return rng.random((channels, len(owners)))
+    counts = np.bincount(owners, minlength=len(rng))
+    starts = np.cumsum(counts) - counts
+    return np.concatenate(
+        [
+            (
+                g.cell_random(ys[i : i + n], xs[i : i + n], width, channels)
+                if isinstance(g, CommonStream)
+                else g.random((channels, n))
+            )
+            for g, i, n in zip(rng, starts, counts)
+        ]
+        + [np.empty((channels, 0))],
+        axis=1,
+    )
+
+
+def _splitmix64(z):
+    with np.errstate(over="ignore"):
+        z = z + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+# Счётные случайные числа без состояния: значение зависит только от
+# (seed, step, клетка, канал). Форма результата (channels, клетки), [0, 1).
+def cell_uniform(seed, step, ys, xs, width, channels):
+    key = _splitmix64(np.uint64(seed)) ^ _splitmix64(np.uint64(step))
+    cell = ys.astype(np.uint64) * np.uint64(width) + xs.astype(np.uint64)
+    channel = np.arange(channels, dtype=np.uint64)[:, None]
+    z = _splitmix64(key ^ (cell[None, :] * np.uint64(channels) + channel))
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
@@ -0,0 +1,175 @@
+import functools
+
+import numpy as np
+
+import fire_agents
+import fire_sparse
+
+# Поля построчной сводки advance(..., summaries=True)
+SUMMARY_FIELDS = (
+    "total_steps",
+    "burning",
+    "burned",
+    "extinguished_cells",
+    "total_burned_cells",
+)
+
+
+# Один запуск start_simulation() целиком: огонь (SparseFire), агенты, их
+# счётчики и генератор случайных чисел. Всё состояние запуска находится в
+# этом объекте, поэтому его можно сохранить и восстановить (fire_checkpoint).
+class Simulation:
+    # fire_agents.SpatialHash агентов (ключ - номер агента) после
+    # attach_index(); обновляется после каждого хода агентов
+    agent_index = None
+
+    def __init__(
+        self,
+        grid_size,
+        num_agents,
+        probs,
+        rain_probability,
+        fire_life,
+        extinguish_area,
+        rng,
+        agent_mode="sequential",
+    ):
+        self.fire = fire_sparse.SparseFire(
+            grid_size, grid_size, probs, rain_probability, fire_life, rng
+        )
+        self.extinguish_area = extinguish_area
+        self.agent_mode = agent_mode
+        self.agents = np.stack(
+            [
+                rng.integers(0, grid_size, num_agents),
+                rng.choice([0, grid_size - 1], num_agents),
+            ],
+            axis=-1,
+        )
+        self.agent_moves = np.zeros(num_agents, dtype=int)
+        self.extinguished_by_agent = np.zeros(num_agents, dtype=int)
+        self.total_steps = 0
+
+    @property
+    def grid(self):
+        return self.fire.grid
+
+    @property
+    def rng(self):
+        return self.fire.rng
+
+    @property
+    def finished(self):
+        return self.fire.burning == 0
+
+    def ignite(self, x, y):
+        self.fire.ignite(x, y)
+
+    # Индексы горящих клеток (fire.fire_index) и агентов (agent_index)
+    def attach_index(self, bucket_size=8):
+        self.fire.attach_index(bucket_size)
+        self.agent_index = fire_agents.SpatialHash(
+            *self.grid.shape, bucket_size=bucket_size
+        )
+        self._index_agents()
+        return self.fire.fire_index, self.agent_index
+
+    def _index_agents(self):
+        if self.agent_index is not None:
+            self.agent_index.move(
+                np.arange(len(self.agents)), self.agents[:, 1], self.agents[:, 0]
+            )
+
+    # "sequential" - агенты ходят по очереди, как в старом move_agents();
+    # "simultaneous" - все сразу, векторно (для больших команд); остальные
+    # режимы - политики fire_policy.POLICIES (или функция-политика)
+    def _move_agents(self):
+        if self.agent_mode == "simultaneous":
+            return self.fire.move_agents_simultaneous
+        if self.agent_mode == "sequential":
+            return self.fire.move_agents
+        return functools.partial(self.fire.move_agents_policy, policy=self.agent_mode)
+
+    # Шаг: распространение огня, затем ход агентов. Возвращает цели агентов.
+    def step(self):
+        self.total_steps += 1
+        self.fire.step()
+        targets = self._move_agents()(
+            self.agents,
+            self.agent_moves,
+            self.extinguished_by_agent,
+            self.extinguish_area,
+        )
+        self._index_agents()
+        return targets
+
+    # До k шагов (None - до конца пожара) одним вызовом без промежуточных
+    # результатов. field - fire_terrain.ProbabilityField с расписанием ветра.
+    # Возвращает counters() или (counters(), сводка по шагам) при summaries.
+    def advance(self, k=None, summaries=False, field=None):
+        fire = self.fire
+        step = fire.step
+        move_agents = self._move_agents()
+        args = (
+            self.agents,
+            self.agent_moves,
+            self.extinguished_by_agent,
+            self.extinguish_area,
+        )
+        rows = []
+        n = 0
+        while fire.burning and (k is None or n < k):
+            if field is not None:
+                field.update(self.total_steps)
+            self.total_steps += 1
+            step()
+            move_agents(*args)
+            self._index_agents()
+            n += 1
+            if summaries:
+                rows.append(
+                    (
+                        self.total_steps,
+                        fire.burning,
+                        fire.burned,
+                        fire.extinguished,
+                        fire.total_burned_cells,
+                    )
+                )
+        if summaries:
+            rows = np.array(rows, dtype=np.int64).reshape(-1, len(SUMMARY_FIELDS))
+            return self.counters(), rows
+        return self.counters()
+
+    def counters(self):
+        return {
+            "total_burned_cells": self.fire.total_burned_cells,
+            "extinguished_cells": self.fire.extinguished,
+            "total_steps_to_extinguish": int(self.agent_moves.sum()),
+            "total_steps": self.total_steps,
+            "agent_moves": int(self.agent_moves.sum()),
+        }
+
+    def state_dict(self):
+        return {
+            "fire": self.fire.state_dict(),
+            "extinguish_area": self.extinguish_area,
+            "agent_mode": self.agent_mode,
+            "agents": self.agents,
+            "agent_moves": self.agent_moves,
+            "extinguished_by_agent": self.extinguished_by_agent,
+            "total_steps": self.total_steps,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        simulation = cls.__new__(cls)
+        for name, value in state.items():
+            setattr(simulation, name, value)
+        simulation.fire = fire_sparse.SparseFire.from_state(state["fire"])
+        return simulation
+
+
+# advance() для любого движка с методом advance (Simulation, Ensemble)
+def advance(state, k=None, summaries=False, **kwargs):
+    return state.advance(k, summaries, **kwargs)
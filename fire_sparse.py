@@ -0,0 +1,275 @@
+import numpy as np
+
+import fire_agents
+import fire_kernel
+import fire_policy
+
+# С этого числа агентов цели берутся из поля ближайшего огня
+# (fire_agents.nearest_fire), а не поиском по фронту для каждого агента
+FIELD_MIN_AGENTS = 16
+
+
+# Движок с явным фронтом огня: горящие клетки хранятся списком координат с
+# возрастом, поэтому работа за шаг пропорциональна размеру фронта, а не всей
+# сетке. Счётчики горящих, сгоревших и потушенных клеток ведутся
+# инкрементально, проверка окончания стоит O(1).
+class SparseFire:
+    # fire_agents.SpatialHash горящих клеток (ключ - y * W + x), если
+    # подключён через attach_index(); обновляется при поджоге, выгорании и
+    # тушении. В state_dict() не входит, после загрузки подключается заново.
+    fire_index = None
+
+    def __init__(self, height, width, probs, rain_probability, fire_life, rng):
+        self.grid = np.zeros((height, width), dtype=np.uint8)
+        self.probs = probs
+        self.rain_probability = rain_probability
+        self.fire_life = fire_life
+        self.rng = rng
+
+        self.front_y = np.empty(0, dtype=np.int64)
+        self.front_x = np.empty(0, dtype=np.int64)
+        self.front_age = np.empty(0, dtype=np.int64)
+
+        self.burning = 0  # Горящие клетки
+        self.burned = 0  # Выгоревшие клетки
+        self.extinguished = 0  # Потушенные агентами клетки
+        self.total_burned_cells = 0  # Поджоги, как в spread_fire()
+
+    def ignite(self, x, y):
+        if self.grid[y, x] == fire_kernel.BURNING:
+            return
+        self.grid[y, x] = fire_kernel.BURNING
+        # Клетка могла остаться во фронте после тушения
+        stale = (self.front_y == y) & (self.front_x == x)
+        self.front_y = np.append(self.front_y[~stale], y)
+        self.front_x = np.append(self.front_x[~stale], x)
+        self.front_age = np.append(self.front_age[~stale], 1)
+        self.burning += 1
+        if self.fire_index is not None:
+            self.fire_index.insert(y * self.grid.shape[1] + x, y, x)
+
+    # Индекс горящих клеток для запросов по радиусу и k ближайших
+    def attach_index(self, bucket_size=8):
+        height, width = self.grid.shape
+        self.fire_index = fire_agents.SpatialHash(height, width, bucket_size)
+        fy, fx = self._alive_front()
+        self.fire_index.insert(fy * width + fx, fy, fx)
+        return self.fire_index
+
+    def _unindex(self, fy, fx):
+        if self.fire_index is not None:
+            self.fire_index.remove(fy * self.grid.shape[1] + fx)
+
+    # Тушение клеток по координатам; возвращает маску реально потушенных
+    def extinguish(self, ys, xs):
+        hit = self.grid[ys, xs] == fire_kernel.BURNING
+        self.grid[ys[hit], xs[hit]] = fire_kernel.BURNED
+        self._unindex(ys[hit], xs[hit])
+        count = int(np.count_nonzero(hit))
+        self.burning -= count
+        self.extinguished += count
+        return hit
+
+    # Значения параметра (скаляр или карта) в клетках фронта
+    def _at(self, values, fy, fx):
+        if np.size(values) == 1:
+            return np.reshape(values, ())
+        return np.broadcast_to(values, self.grid.shape)[fy, fx]
+
+    def step(self):
+        height, width = self.grid.shape
+        flat_grid = self.grid.reshape(-1)
+
+        # Потушенные клетки удаляются из фронта лениво
+        alive = self.grid[self.front_y, self.front_x] == fire_kernel.BURNING
+        fy = self.front_y[alive]
+        fx = self.front_x[alive]
+        age = self.front_age[alive] + 1
+
+        out = age > self.fire_life
+        self.grid[fy[out], fx[out]] = fire_kernel.BURNED
+        self._unindex(fy[out], fx[out])
+        self.burned += int(np.count_nonzero(out))
+        fy = fy[~out]
+        fx = fx[~out]
+        age = age[~out]
+
+        draws = self.rng.random((len(fire_kernel.DIRECTIONS) + 1, len(fy)))
+        rain = draws[0] < self._at(self.rain_probability, fy, fx)
+
+        targets = []
+        for d, (dy, dx) in enumerate(fire_kernel.DIRECTIONS):
+            p = np.where(
+                rain,
+                self._at(self.probs[1, d], fy, fx),
+                self._at(self.probs[0, d], fy, fx),
+            )
+            spread = draws[d + 1] < p
+            ty = fy[spread] + dy
+            tx = fx[spread] + dx
+            inside = (ty >= 0) & (ty < height) & (tx >= 0) & (tx < width)
+            t = ty[inside] * width + tx[inside]
+            targets.append(t[flat_grid[t] == fire_kernel.FUEL])
+
+        targets = np.concatenate(targets)
+        self.total_burned_cells += len(targets)
+        new = np.unique(targets)
+        flat_grid[new] = fire_kernel.BURNING
+
+        self.front_y = np.concatenate([fy, new // width])
+        self.front_x = np.concatenate([fx, new % width])
+        self.front_age = np.concatenate([age, np.zeros(len(new), dtype=np.int64)])
+        self.burning = len(self.front_y)
+        if self.fire_index is not None:
+            self.fire_index.insert(new, new // width, new % width)
+
+    # Ход агентов по очереди, как в move_agents(): цель - ближайшая горящая
+    # клетка фронта (при равенстве - последняя по строкам), тушение вокруг
+    # позиции до хода. agents - массив (N, 2) координат (x, y). Возвращает
+    # цели агентов (-1 для агентов, которым не досталось огня).
+    def move_agents(self, agents, agent_moves, extinguished_by_agent, extinguish_area):
+        height, width = self.grid.shape
+        half = extinguish_area // 2
+        targets = np.full((len(agents), 2), -1)
+        if len(agents) >= FIELD_MIN_AGENTS:
+            return self._move_agents_field(
+                agents, agent_moves, extinguished_by_agent, half, targets
+            )
+
+        # Горящие клетки фронта; потушенные удаляются из списка сразу
+        fy, fx = self._alive_front()
+        cell = fy * width + fx
+
+        for i in range(len(agents)):
+            if len(cell) == 0:
+                break
+            x, y = agents[i]
+
+            key = ((fx - x) ** 2 + (fy - y) ** 2) * (height * width) - cell
+            target = np.argmin(key)
+            targets[i] = fx[target], fy[target]
+            agents[i, 0] = min(width - 1, max(0, x + (1 if fx[target] > x else -1)))
+            agents[i, 1] = min(height - 1, max(0, y + (1 if fy[target] > y else -1)))
+            agent_moves[i] += 1
+
+            # Все горящие клетки есть во фронте, поэтому окно тушения
+            # проверяется по списку фронта, а не по клеткам окна
+            hit = (np.abs(fy - y) <= half) & (np.abs(fx - x) <= half)
+            count = int(np.count_nonzero(hit))
+            if count:
+                self.grid[fy[hit], fx[hit]] = fire_kernel.BURNED
+                self._unindex(fy[hit], fx[hit])
+                self.burning -= count
+                self.extinguished += count
+                extinguished_by_agent[i] += count
+                keep = ~hit
+                fy = fy[keep]
+                fx = fx[keep]
+                cell = cell[keep]
+
+        return targets
+
+    # Одновременный ход всех агентов (fire_agents.move_agents_simultaneous)
+    def move_agents_simultaneous(
+        self, agents, agent_moves, extinguished_by_agent, extinguish_area
+    ):
+        targets, cells = fire_agents.move_agents_simultaneous(
+            self.grid, agents, agent_moves, extinguished_by_agent, extinguish_area
+        )
+        self._unindex(*np.divmod(cells, self.grid.shape[1]))
+        self.burning -= len(cells)
+        self.extinguished += len(cells)
+        return targets
+
+    # Ход агентов по политике fire_policy (имя из POLICIES или функция)
+    def move_agents_policy(
+        self, agents, agent_moves, extinguished_by_agent, extinguish_area, policy
+    ):
+        targets, cells = fire_policy.step_agents(
+            self.grid[None],
+            agents[None],
+            np.ones((1, len(agents)), dtype=bool),
+            agent_moves[None],
+            extinguished_by_agent[None],
+            extinguish_area,
+            policy,
+        )
+        self._unindex(*np.divmod(cells, self.grid.shape[1]))
+        self.burning -= len(cells)
+        self.extinguished += len(cells)
+        return targets[0]
+
+    def _alive_front(self):
+        alive = self.grid[self.front_y, self.front_x] == fire_kernel.BURNING
+        return self.front_y[alive], self.front_x[alive]
+
+    # То же для большого числа агентов: одно поле ближайшего огня на шаг,
+    # цель агента берётся из поля. Если цель уже потушил предыдущий агент,
+    # она ищется заново по фронту; иначе она остаётся ближайшей и среди
+    # оставшихся клеток, поэтому результат совпадает с поиском по фронту.
+    def _move_agents_field(
+        self, agents, agent_moves, extinguished_by_agent, half, targets
+    ):
+        height, width = self.grid.shape
+        flat_grid = self.grid.reshape(-1)
+        _, nearest = fire_agents.nearest_fire(
+            self.grid == fire_kernel.BURNING, agents[:, 1], agents[:, 0]
+        )
+
+        for i in range(len(agents)):
+            if self.burning == 0:
+                break
+            x, y = agents[i]
+
+            target = nearest[i]
+            if flat_grid[target] != fire_kernel.BURNING:
+                fy, fx = self._alive_front()
+                key = ((fx - x) ** 2 + (fy - y) ** 2) * (height * width) - (
+                    fy * width + fx
+                )
+                k = np.argmin(key)
+                target = fy[k] * width + fx[k]
+            ty, tx = divmod(int(target), width)
+            targets[i] = tx, ty
+            agents[i, 0] = min(width - 1, max(0, x + (1 if tx > x else -1)))
+            agents[i, 1] = min(height - 1, max(0, y + (1 if ty > y else -1)))
+            agent_moves[i] += 1
+
+            window = self.grid[
+                max(y - half, 0) : y + half + 1, max(x - half, 0) : x + half + 1
+            ]
+            hit = window == fire_kernel.BURNING
+            count = int(np.count_nonzero(hit))
+            if count:
+                window[hit] = fire_kernel.BURNED
+                wy, wx = np.nonzero(hit)
+                self._unindex(wy + max(y - half, 0), wx + max(x - half, 0))
+                self.burning -= count
+                self.extinguished += count
+                extinguished_by_agent[i] += count
+
+        return targets
+
+    # Полное состояние движка для fire_checkpoint
+    def state_dict(self):
+        return {
+            "grid": self.grid,
+            "probs": self.probs,
+            "rain_probability": np.asarray(self.rain_probability),
+            "fire_life": self.fire_life,
+            "rng": self.rng,
+            "front_y": self.front_y,
+            "front_x": self.front_x,
+            "front_age": self.front_age,
+            "burning": self.burning,
+            "burned": self.burned,
+            "extinguished": self.extinguished,
+            "total_burned_cells": self.total_burned_cells,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        fire = cls.__new__(cls)
+        for name, value in state.items():
+            setattr(fire, name, value)
+        return fire
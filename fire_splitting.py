@@ -0,0 +1,113 @@
+from statistics import NormalDist
+
+import numpy as np
+
+import fire_ensemble
+import fire_kernel
+import fire_rng
+import fire_state
+
+# Вероятность редкого исхода (например, сгорело больше 80% сетки, несмотря на
+# агентов) многоуровневым расщеплением с фиксированным усилием. Путь к
+# порогу разбит уровнями levels[0] < ... < levels[-1] = порог по доле
+# затронутых огнём клеток (горящие и сгоревшие, доля только растёт). На
+# каждом этапе effort траекторий идут, пока не достигнут следующего уровня
+# или огонь не погаснет; p_k - доля достигших. Следующий этап начинается с
+# effort копий (Ensemble.gather) состояний, достигших уровня, выбранных
+# равновероятно с возвращением; у каждой копии свой поток
+# fire_rng.stream(master_seed, повтор, этап, номер). Оценка p_1 * ... * p_m
+# несмещённая; погрешность считается по repeats независимым повторам всего
+# расщепления.
+
+
+# Доля клеток каждой реплики, которых коснулся огонь
+def burned_fraction(cells):
+    grid = fire_state.state(cells)
+    return np.count_nonzero(grid != fire_kernel.FUEL, axis=(-2, -1)) / (
+        grid.shape[-2] * grid.shape[-1]
+    )
+
+
+# Этап расщепления: реплики, достигшие уровня (в том числе на шаге, где огонь
+# погас), копируются в hits до того, как выбыть из ансамбля
+class _Stage(fire_ensemble.Ensemble):
+    level = 1.0
+    hits = ()
+
+    def _retire(self, done):
+        reached = done & (burned_fraction(self.cells) >= self.level)
+        if reached.any():
+            self.hits.append(
+                fire_ensemble.Ensemble.gather([(self, np.flatnonzero(reached))], None)
+            )
+        super()._retire(done)
+
+    # Шаги до выбытия всех реплик; возвращает (копии достигших, их число)
+    def run_to_level(self, level):
+        self.level = level
+        self.hits = []
+        self._retire(burned_fraction(self.cells) >= level)
+        while self.alive:
+            self.step()
+            if self.alive:
+                self._retire(burned_fraction(self.cells) >= level)
+        return self.hits, sum(hit.size for hit in self.hits)
+
+
+# Одно расщепление. make_ensemble(rng) - начальный ансамбль из len(rng)
+# реплик (список потоков). Возвращает вероятности уровней p_k (после этапа без
+# достигших - нули).
+def split(make_ensemble, levels, effort, master_seed, repeat=0):
+    stage = make_ensemble(
+        fire_rng.streams(master_seed, [(repeat, 0, i) for i in range(effort)])
+    )
+    stage = _Stage.gather([(stage, np.arange(stage.alive))], stage.rng)
+    probabilities = np.zeros(len(levels))
+    for k, level in enumerate(levels):
+        hits, count = stage.run_to_level(level)
+        probabilities[k] = count / effort
+        if count == 0 or k == len(levels) - 1:
+            break
+        chosen = np.sort(
+            fire_rng.stream(master_seed, repeat, k + 1).integers(0, count, effort)
+        )
+        offsets = np.cumsum([0] + [hit.size for hit in hits])
+        owner = np.searchsorted(offsets, chosen, side="right") - 1
+        stage = _Stage.gather(
+            [
+                (hits[h], chosen[owner == h] - offsets[h])
+                for h in np.unique(owner).tolist()
+            ],
+            fire_rng.streams(master_seed, [(repeat, k + 1, i) for i in range(effort)]),
+        )
+    return probabilities
+
+
+# Оценка вероятности достичь levels[-1] по repeats независимым расщеплениям.
+# Возвращает словарь: probability - среднее оценок повторов, std_error и
+# ci_half_width - её погрешность, estimates - оценки повторов,
+# level_probabilities - p_k повторов (repeats, уровни), simulations - число
+# запущенных траекторий (для сравнения с простым Монте-Карло).
+def tail_probability(
+    make_ensemble, levels, effort, master_seed, repeats=10, confidence=0.95
+):
+    level_probabilities = np.array(
+        [
+            split(make_ensemble, levels, effort, master_seed, repeat)
+            for repeat in range(repeats)
+        ]
+    ).reshape(repeats, len(levels))
+    estimates = level_probabilities.prod(axis=1)
+    # Этапы после первого без достигших уровня не запускались
+    failed = level_probabilities == 0
+    stages = np.where(failed.any(axis=1), failed.argmax(axis=1) + 1, len(levels))
+    std_error = estimates.std(ddof=1) / np.sqrt(repeats) if repeats > 1 else np.nan
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return {
+        "probability": float(estimates.mean()),
+        "std_error": float(std_error),
+        "ci_half_width": float(z * std_error),
+        "estimates": estimates,
+        "level_probabilities": level_probabilities,
+        "simulations": int(effort * stages.sum()),
+    }
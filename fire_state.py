@@ -0,0 +1,110 @@
+import numpy as np
+
+import fire_kernel
+
+# Компактное состояние клетки в одном uint8: младшие 2 бита - состояние
+# (FUEL, BURNING, 2, BURNED), старшие 6 бит - возраст огня (fire_duration).
+# FIRE_LIFE должен быть меньше MAX_AGE: иначе возраст переполняется раньше,
+# чем клетка догорит, и огонь не гаснет никогда.
+STATE_MASK = 0b11
+AGE_SHIFT = 2
+MAX_AGE = 0xFF >> AGE_SHIFT
+
+
+# Проверка fire_life для движков на упакованной сетке
+def check_fire_life(fire_life):
+    if np.any(np.asarray(fire_life) >= MAX_AGE):
+        raise ValueError(
+            f"fire_life={fire_life} does not fit the packed burn age: "
+            f"it must be less than {MAX_AGE}"
+        )
+
+
+# (grid, fire_duration) -> упакованный массив uint8
+def encode(grid, fire_duration):
+    age = np.minimum(fire_duration, MAX_AGE).astype(np.uint8)
+    return (age << AGE_SHIFT) | (np.asarray(grid) & STATE_MASK).astype(np.uint8)
+
+
+# Упакованный массив -> (grid, fire_duration) для отрисовки, метрик и сохранения
+def decode(cells):
+    return state(cells), age(cells)
+
+
+def state(cells):
+    return cells & STATE_MASK
+
+
+def age(cells):
+    return cells >> AGE_SHIFT
+
+
+# Новая упакованная сетка с одной или несколькими ведущими осями (ансамбль)
+def empty(shape):
+    return np.zeros(shape, dtype=np.uint8)
+
+
+def ignite(cells, y, x):
+    cells[..., y, x] = (1 << AGE_SHIFT) | fire_kernel.BURNING
+
+
+# Шаг распространения огня прямо в упакованном массиве, без копии сетки.
+# Маски считаются по состоянию до шага, поэтому запись на месте сохраняет
+# синхронную семантику spread_fire(). Возвращает число поджогов.
+def spread_fire_packed(cells, probs, rain_probability, fire_life, rng):
+    return spread_fire_front(cells, probs, rain_probability, fire_life, rng)[0]
+
+
+# То же с одним проходом по всей сетке (поиск горящих клеток): дальше шаг
+# работает только с горящими клетками и их соседями. Возвращает (число
+# поджогов, горящие после шага клетки - плоские индексы по возрастанию).
+def spread_fire_front(cells, probs, rain_probability, fire_life, rng):
+    work = np.ascontiguousarray(cells)
+    flat = work.reshape(-1)
+    burning = np.flatnonzero(state(flat) == fire_kernel.BURNING)
+    aged = flat[burning] + (1 << AGE_SHIFT)
+    burned_out = age(aged) > fire_life
+    active = burning[~burned_out]
+
+    targets, ignitions = fire_kernel.ignite_from(
+        active,
+        cells.shape,
+        lambda index: state(flat[index]) == fire_kernel.FUEL,
+        probs,
+        rain_probability,
+        rng,
+    )
+    aged[burned_out] += fire_kernel.BURNED - fire_kernel.BURNING
+    flat[burning] = aged
+    flat[targets] = fire_kernel.BURNING
+    if work is not cells:
+        cells[...] = work
+
+    # Подожжённые клетки были топливом и не совпадают с active, но одна
+    # клетка может загореться от нескольких соседей
+    front = np.sort(np.concatenate([active, targets]))
+    return ignitions, front[np.diff(front, prepend=-1) != 0]
+
+
+# Битовые плоскости состояния для очень больших сеток и снимков: 2 бита на
+# клетку. Возраст хранится только для горящих клеток.
+def pack_planes(cells):
+    grid = state(cells)
+    burning = np.nonzero(grid == fire_kernel.BURNING)
+    return {
+        "shape": np.array(cells.shape),
+        "low": np.packbits(grid & 1),
+        "high": np.packbits(grid >> 1),
+        "burning": np.stack(burning).astype(np.uint32),
+        "age": age(cells)[burning],
+    }
+
+
+def unpack_planes(planes):
+    shape = tuple(planes["shape"])
+    size = int(np.prod(shape))
+    low = np.unpackbits(planes["low"], count=size)
+    high = np.unpackbits(planes["high"], count=size)
+    cells = (low | (high << 1)).reshape(shape)
+    cells[tuple(planes["burning"].astype(np.intp))] |= planes["age"] << AGE_SHIFT
+    return cells
@@ -0,0 +1,225 @@
+import itertools
+import json
+import sqlite3
+
+import numpy as np
+
+import fire_batch
+import fire_ensemble
+
+# Перебор параметров с продолжением после сбоя. Точки перебора - словари
+# параметров запуска (grid() - все сочетания, latin_hypercube() - выборка
+# латинским гиперкубом). Задания (точка, запуск) хранятся в таблице SQLite со
+# статусом и результатом; готовый пакет записывается сразу, поэтому
+# прерванный перебор продолжается с тех заданий, которые не успели
+# закончиться.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS jobs (
+    point INTEGER NOT NULL,
+    run INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    results TEXT,
+    PRIMARY KEY (point, run)
+);
+"""
+
+
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+# Диапазон значений оси [low, high]; целые границы - целые значения с шагом
+# step (low, low + step, ... не больше high, например нечётные размеры).
+# Список или кортеж на оси - это варианты, диапазон задаётся только так.
+# grid() берёт num равномерно расставленных значений (для целых границ
+# по умолчанию - все), latin_hypercube() - значения из всего диапазона.
+class Range:
+    def __init__(self, low, high, num=None, step=1):
+        if high < low:
+            raise ValueError(f"range low={low} is above high={high}")
+        self.low = low
+        self.high = high
+        self.num = num
+        self.step = step
+        if self.integer and (not isinstance(step, int) or step < 1):
+            raise ValueError(f"integer range needs a positive integer step, not {step}")
+
+    @property
+    def integer(self):
+        return isinstance(self.low, int) and isinstance(self.high, int)
+
+    # Значения для grid()
+    def values(self):
+        if self.integer:
+            values = np.arange(self.low, self.high + 1, self.step)
+            if self.num is None:
+                return values.tolist()
+            index = np.rint(np.linspace(0, len(values) - 1, self.num)).astype(int)
+            return values[np.unique(index)].tolist()
+        if self.num is None:
+            raise ValueError(
+                f"grid needs num for a non-integer range {self.low}..{self.high}"
+            )
+        return np.linspace(self.low, self.high, self.num)
+
+    # Значения в точках u из [0, 1) для latin_hypercube()
+    def sample(self, u):
+        if self.integer:
+            count = (self.high - self.low) // self.step + 1
+            return self.low + self.step * (u * count).astype(int)
+        return self.low + u * (self.high - self.low)
+
+
+# Все сочетания значений осей: grid(spread_prob=[0.2, 0.3], num_agents=5)
+# -> [{"spread_prob": 0.2, "num_agents": 5}, {"spread_prob": 0.3, ...}].
+# Ось - список или кортеж вариантов, Range или одно значение.
+def grid(**axes):
+    names = list(axes)
+    values = [_variants(axes[name]) for name in names]
+    return [
+        {name: _plain(v) for name, v in zip(names, point)}
+        for point in itertools.product(*values)
+    ]
+
+
+def _variants(axis):
+    if isinstance(axis, Range):
+        return axis.values()
+    if isinstance(axis, (list, tuple)):
+        return axis
+    return [axis]
+
+
+# samples точек латинского гиперкуба: каждая ось делится на samples равных
+# полос, и в каждую полосу попадает ровно одна точка. Ось - как в grid():
+# Range, список или кортеж вариантов (выбираются равновероятно) или одно
+# значение.
+def latin_hypercube(samples, seed=None, **axes):
+    rng = np.random.default_rng(seed)
+    points = [{} for _ in range(samples)]
+    for name, axis in axes.items():
+        u = (rng.permutation(samples) + rng.random(samples)) / samples
+        if isinstance(axis, Range):
+            values = axis.sample(u)
+        else:
+            variants = _variants(axis)
+            values = [variants[i] for i in (u * len(variants)).astype(int)]
+        for point, value in zip(points, values):
+            point[name] = _plain(value)
+    return points
+
+
+# Таблица заданий перебора в файле SQLite
+class JobStore:
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(_SCHEMA)
+
+    # Главное зерно перебора; None - перебор ещё не начинался
+    @property
+    def master_seed(self):
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE name = 'master_seed'"
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    # Задания ((point, run), параметры) добавляются, уже записанные
+    # остаются как есть. Задание с тем же ключом, но другими параметрами -
+    # ошибка: это другой перебор.
+    def add(self, jobs, master_seed):
+        stored = dict(
+            ((point, run), params)
+            for point, run, params in self.connection.execute(
+                "SELECT point, run, params FROM jobs"
+            )
+        )
+        rows = []
+        for (point, run), params in jobs:
+            text = json.dumps(params, sort_keys=True)
+            if (point, run) not in stored:
+                rows.append((point, run, text))
+            elif stored[point, run] != text:
+                raise ValueError(
+                    f"job {(point, run)} in {self.path} has different parameters"
+                )
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO meta VALUES ('master_seed', ?)",
+                (json.dumps(master_seed),),
+            )
+            self.connection.executemany(
+                "INSERT INTO jobs (point, run, params) VALUES (?, ?, ?)", rows
+            )
+
+    # Незаконченные задания ((point, run), параметры)
+    def pending(self):
+        return [
+            ((point, run), json.loads(params))
+            for point, run, params in self.connection.execute(
+                "SELECT point, run, params FROM jobs WHERE status != 'done' "
+                "ORDER BY point, run"
+            )
+        ]
+
+    # Результаты пакета (ключи, results ансамбля) одной транзакцией
+    def finish(self, keys, results):
+        rows = []
+        for i, (point, run) in enumerate(keys):
+            n = int(results["num_agents"][i])
+            row = {name: int(results[name][i]) for name in fire_ensemble.COUNTERS}
+            row["agent_moves"] = int(results["agent_moves"][i].sum())
+            row["extinguished_by_agent"] = results["extinguished_by_agent"][
+                i, :n
+            ].tolist()
+            rows.append((json.dumps(row), point, run))
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE jobs SET status = 'done', results = ? "
+                "WHERE point = ? AND run = ?",
+                rows,
+            )
+
+    # (готово, всего)
+    def progress(self):
+        return self.connection.execute(
+            "SELECT COALESCE(SUM(status = 'done'), 0), COUNT(*) FROM jobs"
+        ).fetchone()
+
+    # Готовые задания: словари point, run, параметры и результаты
+    def results(self):
+        return [
+            dict(point=point, run=run, **json.loads(params), **json.loads(results))
+            for point, run, params, results in self.connection.execute(
+                "SELECT point, run, params, results FROM jobs "
+                "WHERE status = 'done' ORDER BY point, run"
+            )
+        ]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Незаконченные задания store на пуле fire_batch.run_batch(); каждый готовый
+# пакет сразу записывается. settings - общие аргументы Ensemble. Ctrl-C
+# прерывает перебор, записанные пакеты сохраняются. Возвращает число
+# законченных за этот вызов заданий.
+def run_sweep(store, settings, workers=None, chunk_size=None, progress=None):
+    done = 0
+    for keys, results in fire_batch.run_batch(
+        store.pending(), store.master_seed, settings, workers, chunk_size
+    ):
+        store.finish(keys, results)
+        done += len(keys)
+        if progress is not None:
+            progress(*store.progress())
+    return done
@@ -0,0 +1,117 @@
+import numpy as np
+
+import fire_kernel
+
+# Неоднородная местность: поле вероятностей распространения probs[дождь,
+# направление, y, x] формы (2, 4, H, W), которое ядро и движки принимают
+# вместо скалярных вероятностей direction_probabilities(). Поле строится один
+# раз из карт топлива и высот и пересчитывается только при их изменении; при
+# смене ветра обновляется на месте, поэтому движки, которые держат ссылку на
+# field.probs, сразу видят новый ветер.
+
+
+# Ветер как вектор (dy, dx) в сторону, куда он дует, длиной wind_strength.
+# "N" (ветер с севера) дует на юг, как в WIND_DIRECTIONS.
+def wind_vector(wind_direction, wind_strength):
+    dy, dx = fire_kernel.DIRECTIONS[fire_kernel.WIND_DIRECTIONS[wind_direction]]
+    return wind_strength * dy, wind_strength * dx
+
+
+# Добавка ветра по направлениям DIRECTIONS: проекция ветра на направление,
+# только попутная составляющая
+def wind_bonus(wind):
+    directions = np.array(fire_kernel.DIRECTIONS, dtype=float)
+    return np.maximum(directions @ np.asarray(wind, dtype=float), 0.0)
+
+
+# Значения карты в соседней клетке по направлению (dy, dx); за краем - fill
+def neighbour(raster, dy, dx, fill=0.0):
+    out = np.full(raster.shape, fill, dtype=float)
+    h, w = raster.shape
+    out[max(-dy, 0) : h + min(-dy, 0), max(-dx, 0) : w + min(-dx, 0)] = raster[
+        max(dy, 0) : h + min(dy, 0), max(dx, 0) : w + min(dx, 0)
+    ]
+    return out
+
+
+# Расписание ветра: список (шаг, направление, сила), ветер действует с
+# указанного шага до следующей записи; до первой записи - wind
+def wind_at(schedule, step, wind=(0.0, 0.0)):
+    for start, wind_direction, wind_strength in sorted(schedule, key=lambda e: e[0]):
+        if start > step:
+            break
+        wind = wind_vector(wind_direction, wind_strength)
+    return wind
+
+
+# Поле вероятностей для сетки shape:
+# - spread_prob - базовая вероятность, скаляр или карта (H, W);
+# - fuel - множитель горючести клетки-цели (0 - вода или просека, 1 - лес);
+# - elevation - карта высот: огонь вверх по склону идёт быстрее,
+#   множитель exp(slope_factor * (высота цели - высота источника));
+# - schedule - расписание ветра для update(step).
+# При дожде базовая вероятность уменьшается вдвое, ветер добавляется после,
+# как в direction_probabilities(); без карт поле совпадает с ней.
+class ProbabilityField:
+    def __init__(
+        self,
+        shape,
+        spread_prob,
+        wind_direction="N",
+        wind_strength=0.0,
+        fuel=None,
+        elevation=None,
+        slope_factor=0.0,
+        schedule=None,
+    ):
+        self.shape = shape
+        self.spread_prob = spread_prob
+        self.fuel = fuel
+        self.elevation = elevation
+        self.slope_factor = slope_factor
+        self.schedule = schedule
+        self.wind = wind_vector(wind_direction, wind_strength)
+        self._initial_wind = self.wind
+        self.probs = np.empty((2, len(fire_kernel.DIRECTIONS)) + tuple(shape))
+        self._rebuild()
+
+    def _rebuild(self):
+        base = np.broadcast_to(np.asarray(self.spread_prob, dtype=float), self.shape)
+        self._base = np.stack([base, base * 0.5])[:, None]
+
+        fuel = np.ones(self.shape) if self.fuel is None else self.fuel
+        self._scale = np.empty((len(fire_kernel.DIRECTIONS),) + tuple(self.shape))
+        for d, (dy, dx) in enumerate(fire_kernel.DIRECTIONS):
+            self._scale[d] = neighbour(fuel, dy, dx)
+            if self.elevation is not None and self.slope_factor:
+                rise = neighbour(self.elevation, dy, dx, np.nan) - self.elevation
+                self._scale[d] *= np.exp(self.slope_factor * np.nan_to_num(rise))
+        self._apply_wind()
+
+    def _apply_wind(self):
+        np.add(self._base, wind_bonus(self.wind)[None, :, None, None], out=self.probs)
+        self.probs *= self._scale
+
+    def set_wind(self, wind_direction, wind_strength):
+        self.set_wind_vector(wind_vector(wind_direction, wind_strength))
+
+    def set_wind_vector(self, wind):
+        wind = tuple(float(w) for w in wind)
+        if wind != self.wind:
+            self.wind = wind
+            self._apply_wind()
+
+    def set_fuel(self, fuel):
+        self.fuel = fuel
+        self._rebuild()
+
+    def set_elevation(self, elevation, slope_factor=None):
+        self.elevation = elevation
+        if slope_factor is not None:
+            self.slope_factor = slope_factor
+        self._rebuild()
+
+    # Ветер на шаге step по расписанию; поле меняется только при смене ветра
+    def update(self, step):
+        if self.schedule is not None:
+            self.set_wind_vector(wind_at(self.schedule, step, self._initial_wind))
@@ -0,0 +1,296 @@
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import fire_kernel
+import fire_rng
+import fire_state
+
+# Случайные числа берутся из fire_rng.cell_uniform(): они зависят только от
+# (seed, шаг, клетка), а не от того, какой процесс и какой тайл их считает.
+# Поэтому результат не зависит от числа процессов и совпадает бит в бит с
+# запуском в одном процессе.
+_CHANNELS = len(fire_kernel.DIRECTIONS) + 1
+
+# Сколько секунд главный процесс ждёт процессы на барьере шага, прежде чем
+# считать, что один из них завис или убит (None - без ограничения)
+STEP_TIMEOUT = 600
+
+
+# Разбиение сетки на тайлы: список (y0, y1, x0, x1) и их соседи по 4 сторонам
+def make_tiles(height, width, tile_size):
+    rows = range(0, height, tile_size)
+    cols = range(0, width, tile_size)
+    tiles = [
+        (y0, min(y0 + tile_size, height), x0, min(x0 + tile_size, width))
+        for y0 in rows
+        for x0 in cols
+    ]
+    n_cols = len(cols)
+    neighbours = []
+    for t in range(len(tiles)):
+        ty, tx = divmod(t, n_cols)
+        neighbours.append(
+            [
+                ny * n_cols + nx
+                for ny, nx in ((ty - 1, tx), (ty + 1, tx), (ty, tx - 1), (ty, tx + 1))
+                if 0 <= ny < len(rows) and 0 <= nx < n_cols
+            ]
+        )
+    return tiles, neighbours
+
+
+# Фаза чтения: следующий шаг для внутренней части тайла по его клеткам и
+# ореолу шириной в одну клетку. Сетка не меняется, результат применяется
+# в _apply_tile() после барьера.
+def _advance_tile(cells, tile, probs, rain_probability, fire_life, seed, step):
+    height, width = cells.shape
+    y0, y1, x0, x1 = tile
+    py0, py1, px0, px1 = (
+        max(y0 - 1, 0),
+        min(y1 + 1, height),
+        max(x0 - 1, 0),
+        min(x1 + 1, width),
+    )
+    region = cells[py0:py1, px0:px1]
+    grid = fire_state.state(region)
+
+    burning = grid == fire_kernel.BURNING
+    burned_out = burning & (fire_state.age(region) + 1 > fire_life)
+    sy, sx = np.nonzero(burning & ~burned_out)
+    gy = sy + py0
+    gx = sx + px0
+
+    draws = fire_rng.cell_uniform(seed, step, gy, gx, width, _CHANNELS)
+    rain = draws[0] < np.broadcast_to(rain_probability, cells.shape)[gy, gx]
+
+    interior = (slice(y0 - py0, y1 - py0), slice(x0 - px0, x1 - px0))
+    fuel = grid[interior] == fire_kernel.FUEL
+    targets = np.zeros(fuel.shape, dtype=bool)
+    ignitions = 0
+    for d, (dy, dx) in enumerate(fire_kernel.DIRECTIONS):
+        p = np.where(
+            rain,
+            np.broadcast_to(probs[1, d], cells.shape)[gy, gx],
+            np.broadcast_to(probs[0, d], cells.shape)[gy, gx],
+        )
+        spread = draws[d + 1] < p
+        ty = gy[spread] + dy - y0
+        tx = gx[spread] + dx - x0
+        inside = (ty >= 0) & (ty < y1 - y0) & (tx >= 0) & (tx < x1 - x0)
+        ty = ty[inside]
+        tx = tx[inside]
+        hit = fuel[ty, tx]
+        ignitions += int(np.count_nonzero(hit))
+        targets[ty[hit], tx[hit]] = True
+
+    return burning[interior], burned_out[interior], targets, ignitions
+
+
+# Фаза записи: изменения только внутри своего тайла
+def _apply_tile(cells, tile, update):
+    y0, y1, x0, x1 = tile
+    burning, burned_out, targets, _ = update
+    view = cells[y0:y1, x0:x1]
+    view[burning] += 1 << fire_state.AGE_SHIFT
+    view[burned_out] += fire_kernel.BURNED - fire_kernel.BURNING
+    view[targets] = fire_kernel.BURNING
+    return int(np.count_nonzero(fire_state.state(view) == fire_kernel.BURNING))
+
+
+# Тайлы, в которых или рядом с которыми есть огонь; остальные пропускаются
+def _active_tiles(tile_ids, burning_counts, neighbours):
+    return [
+        t
+        for t in tile_ids
+        if burning_counts[t] > 0 or any(burning_counts[n] > 0 for n in neighbours[t])
+    ]
+
+
+def _step_tiles(cells, tiles, tile_ids, neighbours, counts, params, step):
+    return [
+        (t, _advance_tile(cells, tiles[t], *params, step))
+        for t in _active_tiles(tile_ids, counts, neighbours)
+    ]
+
+
+def _worker(names, shape, tiles, tile_ids, neighbours, params, barrier):
+    cells_shm = shared_memory.SharedMemory(name=names[0])
+    stats_shm = shared_memory.SharedMemory(name=names[1])
+    cells = np.ndarray(shape, dtype=np.uint8, buffer=cells_shm.buf)
+    stats = np.ndarray((3, len(tiles)), dtype=np.int64, buffer=stats_shm.buf)
+    control, counts, ignitions = stats[0], stats[1], stats[2]
+    # Ошибка в одном процессе ломает барьер, чтобы остальные и главный
+    # процесс не ждали его вечно
+    try:
+        while True:
+            barrier.wait()
+            step = int(control[0])
+            if step < 0:
+                break
+            updates = _step_tiles(
+                cells, tiles, tile_ids, neighbours, counts, params, step
+            )
+            barrier.wait()
+            for t, update in updates:
+                counts[t] = _apply_tile(cells, tiles[t], update)
+                ignitions[t] += update[3]
+            barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        del cells, stats, control, counts, ignitions
+        cells_shm.close()
+        stats_shm.close()
+
+
+# Один большой пожар, разбитый на тайлы в общей памяти. Каждый процесс
+# считает свои тайлы (по кругу, для равномерной нагрузки), читает ореол
+# соседей прямо из общей памяти и пропускает тайлы без огня рядом.
+# workers=0 - тот же расчёт в текущем процессе. Если процесс падает или не
+# доходит до барьера за timeout секунд, step() и close() останавливают все
+# процессы и бросают RuntimeError.
+class TiledFire:
+    def __init__(
+        self,
+        height,
+        width,
+        probs,
+        rain_probability,
+        fire_life,
+        seed,
+        tile_size=256,
+        workers=None,
+        timeout=STEP_TIMEOUT,
+    ):
+        fire_state.check_fire_life(fire_life)
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.tile_size = tile_size
+        self.timeout = timeout
+        self.tiles, self.neighbours = make_tiles(height, width, tile_size)
+        self.params = (probs, rain_probability, fire_life, seed)
+        self.steps = 0
+        self.workers = []
+
+        self._cells_shm = shared_memory.SharedMemory(create=True, size=height * width)
+        self._stats_shm = shared_memory.SharedMemory(
+            create=True, size=3 * len(self.tiles) * 8
+        )
+        self.cells = np.ndarray(
+            (height, width), dtype=np.uint8, buffer=self._cells_shm.buf
+        )
+        self.cells[:] = 0
+        stats = np.ndarray(
+            (3, len(self.tiles)), dtype=np.int64, buffer=self._stats_shm.buf
+        )
+        stats[:] = 0
+        self._control, self._counts, self._ignitions = stats[0], stats[1], stats[2]
+
+        if workers:
+            self._barrier = multiprocessing.Barrier(workers + 1)
+            names = (self._cells_shm.name, self._stats_shm.name)
+            for w in range(workers):
+                tile_ids = list(range(w, len(self.tiles), workers))
+                process = multiprocessing.Process(
+                    target=_worker,
+                    args=(
+                        names,
+                        (height, width),
+                        self.tiles,
+                        tile_ids,
+                        self.neighbours,
+                        self.params,
+                        self._barrier,
+                    ),
+                    daemon=True,
+                )
+                process.start()
+                self.workers.append(process)
+
+    @property
+    def grid(self):
+        return fire_state.state(self.cells)
+
+    @property
+    def burning(self):
+        return int(self._counts.sum())
+
+    @property
+    def total_burned_cells(self):
+        return int(self._ignitions.sum())
+
+    def ignite(self, x, y):
+        if self.grid[y, x] != fire_kernel.BURNING:
+            fire_state.ignite(self.cells, y, x)
+            n_cols = -(-self.cells.shape[1] // self.tile_size)
+            self._counts[(y // self.tile_size) * n_cols + x // self.tile_size] += 1
+
+    def step(self):
+        self._control[0] = self.steps
+        if self.workers:
+            self._wait()
+            self._wait()
+            self._wait()
+        else:
+            updates = _step_tiles(
+                self.cells,
+                self.tiles,
+                range(len(self.tiles)),
+                self.neighbours,
+                self._counts,
+                self.params,
+                self.steps,
+            )
+            for t, update in updates:
+                self._counts[t] = _apply_tile(self.cells, self.tiles[t], update)
+                self._ignitions[t] += update[3]
+        self.steps += 1
+
+    def run(self, max_steps=None):
+        while self.burning and (max_steps is None or self.steps < max_steps):
+            self.step()
+
+    # Барьер шага; сломанный барьер (ошибка или зависание процесса)
+    # превращается в RuntimeError, процессы останавливаются
+    def _wait(self):
+        try:
+            self._barrier.wait(self.timeout)
+        except threading.BrokenBarrierError:
+            for process in self.workers:
+                process.join(1)
+            exit_codes = [process.exitcode for process in self.workers]
+            for process in self.workers:
+                process.terminate()
+                process.join()
+            self.workers = []
+            raise RuntimeError(
+                f"tiled fire worker failed or timed out at step {self.steps} "
+                f"(worker exit codes: {exit_codes})"
+            ) from None
+
+    def close(self):
+        try:
+            if self.workers:
+                self._control[0] = -1
+                self._wait()
+                for process in self.workers:
+                    process.join()
+                self.workers = []
+        finally:
+            del self.cells, self._control, self._counts, self._ignitions
+            self._cells_shm.close()
+            self._cells_shm.unlink()
+            self._stats_shm.close()
+            self._stats_shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,6 +1,9 @@
 import pygame
 import numpy as np
-import random
+
+import fire_convolve
+import fire_kernel
+import fire_render
 
 # Параметры симуляции
 GRID_SIZE = 50  # Размер сетки
@@ -14,6 +17,8 @@ WIND_STRENGTH = 0.1  # Влияние ветра на распространен
 RAIN_PROBABILITY = (
     0.8  # Вероятность дождя, замедляющего распространение огня (0.0 - 1.0)
 )
+EMBER_PROBABILITY = 0.0  # Вероятность заброса искр (0 - без искр)
+EMBER_RADIUS = 10  # Дальность заброса искр в клетках
 
 # Цвета
 GREEN = (0, 255, 0)
@@ -38,64 +43,35 @@ def start_simulation():
         (GRID_SIZE * CELL_SIZE, GRID_SIZE * CELL_SIZE + 50)
     )
     pygame.display.set_caption("Fire Simulation")
+    renderer = fire_render.GridRenderer((GRID_SIZE, GRID_SIZE), CELL_SIZE)
 
-    grid = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
-    fire_duration = np.zeros((GRID_SIZE, GRID_SIZE), dtype=int)
+    grid = np.zeros((GRID_SIZE, GRID_SIZE), dtype=np.uint8)
+    fire_duration = np.zeros((GRID_SIZE, GRID_SIZE), dtype=np.uint8)
+    spread_probs = fire_kernel.direction_probabilities(
+        FIRE_SPREAD_PROB, WIND_DIRECTION, WIND_STRENGTH
+    )
+    spread_kernel = fire_convolve.combine(
+        fire_convolve.von_neumann(FIRE_SPREAD_PROB, WIND_DIRECTION, WIND_STRENGTH),
+        fire_convolve.ember_spotting(EMBER_PROBABILITY, EMBER_RADIUS),
+    )
+    rng = np.random.default_rng()
 
     total_burned_cells = 0
 
     def draw_grid():
-        for y in range(GRID_SIZE):
-            for x in range(GRID_SIZE):
-                color = (
-                    GREEN
-                    if grid[y, x] == 0
-                    else RED if grid[y, x] == 1 else BLUE if grid[y, x] == 2 else BLACK
-                )
-                pygame.draw.rect(
-                    screen,
-                    color,
-                    pygame.Rect(x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE),
-                )
+        return renderer.draw_dirty(screen, grid)
 
     def spread_fire():
         nonlocal total_burned_cells
-        new_grid = grid.copy()
-        for y in range(GRID_SIZE):
-            for x in range(GRID_SIZE):
-                if grid[y, x] == 1:
-                    fire_duration[y, x] += 1
-                    if fire_duration[y, x] > FIRE_LIFE:
-                        new_grid[y, x] = 3
-                    else:
-                        spread_prob = FIRE_SPREAD_PROB
-                        if random.random() < RAIN_PROBABILITY:
-                            spread_prob *= 0.5
-
-                        directions = [(y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)]
-                        wind_effects = {
-                            "N": (y + 1, x),
-                            "S": (y - 1, x),
-                            "E": (y, x - 1),
-                            "W": (y, x + 1),
-                        }
-                        wind_y, wind_x = wind_effects[WIND_DIRECTION]
-
-                        for dy, dx in directions:
-                            if (
-                                0 <= dy < GRID_SIZE
-                                and 0 <= dx < GRID_SIZE
-                                and grid[dy][dx] == 0
-                            ):
-                                if (dy, dx) == (wind_y, wind_x):
-                                    if random.random() < spread_prob + WIND_STRENGTH:
-                                        new_grid[dy][dx] = 1
-                                        total_burned_cells += 1
-                                else:
-                                    if random.random() < spread_prob:
-                                        new_grid[dy][dx] = 1
-                                        total_burned_cells += 1
-
+        if EMBER_PROBABILITY > 0:
+            new_grid, ignitions = fire_convolve.spread_fire(
+                grid, fire_duration, spread_kernel, RAIN_PROBABILITY, FIRE_LIFE, rng
+            )
+        else:
+            new_grid, ignitions = fire_kernel.spread_fire(
+                grid, fire_duration, spread_probs, RAIN_PROBABILITY, FIRE_LIFE, rng
+            )
+        total_burned_cells += int(ignitions)
         return new_grid
 
     simulation_running = False
@@ -105,6 +81,9 @@ def start_simulation():
     button_rect = pygame.Rect(
         (GRID_SIZE * CELL_SIZE // 2 - 50, GRID_SIZE * CELL_SIZE + 10, 100, 30)
     )
+    font = pygame.font.Font(None, 30)
+    screen.fill(WHITE)
+    pygame.display.flip()
 
     while running:
         for event in pygame.event.get():
@@ -123,16 +102,15 @@ def start_simulation():
         if simulation_running:
             grid = spread_fire()
 
-        screen.fill(WHITE)
-        draw_grid()
+        # Только изменившиеся клетки и кнопка
+        dirty = draw_grid()
 
         pygame.draw.rect(screen, GREY, button_rect)
         button_text = "Start" if not simulation_running else "Stop"
-        font = pygame.font.Font(None, 30)
         text_surface = font.render(button_text, True, BLACK)
         screen.blit(text_surface, (button_rect.x + 10, button_rect.y + 5))
 
-        pygame.display.flip()
+        pygame.display.update(dirty + [button_rect])
         clock.tick(FPS)
 
     pygame.quit()